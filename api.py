@@ -46,12 +46,14 @@ storage = ChatStorage()
 class QueryRequest(BaseModel):
     query: str
     session_id: Optional[str] = None
+    category: Optional[str] = None  # limite la recherche à une catégorie (sinon routage auto)
 
 class QueryResponse(BaseModel):
     answer: str
     sources: List[dict]
     type: str  # 'hybrid_rag' ou 'general_knowledge'
     latency_ms: float
+    category: Optional[str] = None  # catégorie demandée ou routée
 
 class SessionInfo(BaseModel):
     session_id: str
@@ -80,7 +82,7 @@ async def query_chatbot(request: QueryRequest):
     Send a query to the chatbot
     
     Args:
-        request: QueryRequest with query text and optional session_id
+        request: QueryRequest with query text, optional session_id and category
     
     Returns:
         QueryResponse with answer and metadata
@@ -91,7 +93,7 @@ async def query_chatbot(request: QueryRequest):
         start_time = time.time()
         
         # 💥 CRITICAL FIX HERE: Pass both arguments!
-        result = chatbot.query(request.query, request.session_id) 
+        result = chatbot.query(request.query, request.session_id, category=request.category) 
         
         elapsed_ms = (time.time() - start_time) * 1000
         
@@ -118,7 +120,8 @@ async def query_chatbot(request: QueryRequest):
             answer=result['answer'],
             sources=result.get('sources', []),
             type=result.get('type', 'unknown'),
-            latency_ms=elapsed_ms
+            latency_ms=elapsed_ms,
+            category=result.get('category')
         )
     
     except Exception as e:
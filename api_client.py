@@ -8,12 +8,15 @@ class WikiChatbotAPIClient:
         self.base_url = base_url
     
     # Corrected: Added session_id argument and included it in the payload
-    def query(self, query: str, session_id: Optional[str] = None) -> Dict:
-        """Send query to API, optionally including session_id for context"""
+    def query(self, query: str, session_id: Optional[str] = None,
+              category: Optional[str] = None) -> Dict:
+        """Send query to API, optionally including session_id for context and a category filter"""
         
         payload = {"query": query}
         if session_id:
             payload["session_id"] = session_id
+        if category:
+            payload["category"] = category
             
         response = requests.post(
             f"{self.base_url}/query",
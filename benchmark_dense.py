@@ -0,0 +1,123 @@
+import json
+import time
+import shutil
+import numpy as np
+import chromadb
+from sentence_transformers import SentenceTransformer
+from dense_index import open_dense_index, dense_index_path, export_collection, NumpyDenseIndex
+from ivf_index import IVFIndex
+from evaluate_rag import test_cases
+
+CHROMA_DIR = "./chroma_data"
+COLLECTION_NAME = "wiki"
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+OUTPUT_FILE = 'DENSE_BENCHMARK.json'
+
+
+def benchmark_index(index, query_embeddings, exact_ids, top_k: int, repeats: int) -> dict:
+    """Latence moyenne, recall@k contre la recherche exacte et précision top-1"""
+    latencies = []
+    recalls = []
+    correct = 0
+    for i, query_embedding in enumerate(query_embeddings):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            hits = index.search(query_embedding, top_k=top_k)
+        latencies.append((time.perf_counter() - start) / repeats * 1000)
+        
+        ids = [hit['id'] for hit in hits]
+        recalls.append(len(set(ids) & set(exact_ids[i])) / max(len(exact_ids[i]), 1))
+        if hits and hits[0]['metadata'].get('source') == test_cases[i]['expected_source']:
+            correct += 1
+    
+    return {
+        'avg_latency_ms': round(float(np.mean(latencies)), 3),
+        'p95_latency_ms': round(float(np.percentile(latencies, 95)), 3),
+        'recall_at_k': round(float(np.mean(recalls)), 3),
+        'top1_accuracy': round(correct / len(test_cases), 3)
+    }
+
+
+def run_benchmark(top_k: int = 10, repeats: int = 20, candidates=(32, 64, 128, 256, 512),
+                  nprobes=(1, 4, 8, 16, 32), reduced_dims=(128, 64)):
+    print("="*70)
+    print("DENSE RETRIEVAL BENCHMARK")
+    print("="*70)
+    
+    client = chromadb.PersistentClient(path=CHROMA_DIR)
+    collection = client.get_collection(COLLECTION_NAME)
+    path = dense_index_path(COLLECTION_NAME, CHROMA_DIR)
+    
+    print(f"Loading embedding model: {MODEL_NAME}")
+    model = SentenceTransformer(MODEL_NAME)
+    query_embeddings = model.encode([test['query'] for test in test_cases], convert_to_numpy=True)
+    
+    exact = open_dense_index('numpy', collection, path, model_name=MODEL_NAME)
+    if exact.dims:
+        print(f"⚠️  The dense index is reduced to {exact.dims}d, recall is measured against it")
+    print(f"Corpus: {len(exact)} vectors, top_k={top_k}, {repeats} repeats per query\n")
+    exact_ids = [[hit['id'] for hit in exact.search(q, top_k=top_k)] for q in query_embeddings]
+    
+    configs = [
+        ('chroma', open_dense_index('chroma', collection, path)),
+        ('numpy_exact', exact)
+    ]
+    for n_candidates in candidates:
+        configs.append((
+            f'binary_prefilter_{n_candidates}',
+            open_dense_index('numpy', collection, path, prefilter='binary',
+                             prefilter_candidates=n_candidates)
+        ))
+    if IVFIndex.available(path, len(exact)):
+        for nprobe in nprobes:
+            configs.append((f'ivf_nprobe_{nprobe}',
+                            open_dense_index('numpy', collection, path, nprobe=nprobe)))
+    else:
+        print("ℹ️  No IVF index, run 'python ivf_index.py' to include it\n")
+    
+    # Copies réduites par PCA, exportées à part et supprimées après la mesure
+    reduced_paths = []
+    for dims in reduced_dims:
+        reduced_path = f"{path}_pca{dims}"
+        export_collection(collection, reduced_path, MODEL_NAME, dims=dims)
+        reduced_paths.append(reduced_path)
+        configs.append((f'pca_{dims}d', NumpyDenseIndex(reduced_path)))
+    
+    results = {}
+    print(f"{'Config':<28}{'Avg ms':>10}{'P95 ms':>10}{'Recall@k':>10}{'Top-1':>8}")
+    print("-"*66)
+    for name, index in configs:
+        results[name] = benchmark_index(index, query_embeddings, exact_ids, top_k, repeats)
+        r = results[name]
+        if isinstance(index, NumpyDenseIndex):
+            r['vectors_mb'] = round(index.vectors.nbytes / 1e6, 2)
+            if index.dims:
+                r['explained_variance'] = index.meta['reduction']['explained_variance']
+        print(f"{name:<28}{r['avg_latency_ms']:>10.3f}{r['p95_latency_ms']:>10.3f}"
+              f"{r['recall_at_k']:>10.2f}{r['top1_accuracy']:>8.0%}")
+    
+    for name, index in configs:
+        index.close()
+    for reduced_path in reduced_paths:
+        shutil.rmtree(reduced_path, ignore_errors=True)
+    
+    with open(OUTPUT_FILE, 'w') as f:
+        json.dump({
+            'corpus_size': len(exact),
+            'top_k': top_k,
+            'repeats': repeats,
+            'results': results
+        }, f, indent=2)
+    print(f"\n✅ Results saved to {OUTPUT_FILE}")
+
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Recall/latency report for the dense retrieval backends")
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=20,
+                        help="Searches per query when timing")
+    args = parser.parse_args()
+    
+    run_benchmark(top_k=args.top_k, repeats=args.repeats)
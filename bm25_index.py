@@ -0,0 +1,404 @@
+import os
+import re
+import json
+import time
+import shutil
+import heapq
+import hashlib
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from chunk_store import ChunkStore, CHUNKS_FILE
+from dense_index import _publish
+
+# Index BM25 sur disque, à côté du chunk store (ligne i = chunk i) :
+#   terms.json                          vocabulaire complet (id = position)
+#   postings_docs.u32 / postings_tf.u16 postings triés par terme puis par chunk
+#   term_offsets.u64                    bornes des postings de chaque terme
+#   doc_lengths.u32                     nombre de tokens de chaque chunk
+#   term_max.f32                        score maximal de chaque terme (élagage MaxScore)
+#   doc_terms.u32 / doc_tfs.u16 / doc_offsets.u64 / doc_hashes.md5
+#                                       index direct, réutilisé par les mises à jour
+#   bm25.json                           paramètres et état du chunk store indexé
+BM25_DIR_NAME = 'bm25'
+BM25_VERSION = 2
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+# Même découpage que le TfidfVectorizer d'origine (mots de 2+ caractères, stop words anglais)
+_TOKEN = re.compile(r"(?u)\b\w\w+\b")
+_MAX_TF = np.iinfo(np.uint16).max
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokens indexés d'un texte : minuscules, sans stop words"""
+    return [t for t in _TOKEN.findall(text.lower()) if t not in ENGLISH_STOP_WORDS]
+
+
+def idf(df: np.ndarray, n_docs: int) -> np.ndarray:
+    """idf BM25 (variante toujours positive)"""
+    df = np.asarray(df, dtype=np.float32)
+    return np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+
+def length_norm(doc_lengths: np.ndarray, avg_length: float, k1: float, b: float) -> np.ndarray:
+    """k1 * (1 - b + b * longueur / longueur moyenne), par chunk"""
+    return (k1 * (1 - b + b * np.asarray(doc_lengths, dtype=np.float32)
+                  / (avg_length or 1.0))).astype(np.float32)
+
+
+def bm25_path(chunks_path: str = CHUNKS_FILE) -> str:
+    """Dossier de l'index BM25 d'un chunk store"""
+    return os.path.join(os.path.dirname(chunks_path), BM25_DIR_NAME)
+
+
+def _source_state(chunks_path: str) -> Dict:
+    """Taille et date du chunk store : l'index est à jour tant qu'elles ne changent pas"""
+    stat = os.stat(chunks_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def bm25_is_current(chunks_path: str = CHUNKS_FILE, path: Optional[str] = None) -> bool:
+    """Index BM25 construit sur l'état actuel du chunk store"""
+    meta_path = os.path.join(path or bm25_path(chunks_path), 'bm25.json')
+    if not os.path.exists(meta_path) or not os.path.exists(chunks_path):
+        return False
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    return meta.get('version') == BM25_VERSION and meta.get('source') == _source_state(chunks_path)
+
+
+def build_bm25(chunks_path: str = CHUNKS_FILE, path: Optional[str] = None,
+               k1: float = DEFAULT_K1, b: float = DEFAULT_B, rebuild: bool = False) -> Dict:
+    """
+    Construit ou met à jour l'index BM25 d'un chunk store
+    
+    Mise à jour incrémentale : les chunks dont le contenu (md5) était déjà
+    indexé reprennent leurs termes depuis l'index direct existant, seuls
+    les nouveaux sont tokenisés ; les identifiants de termes sont stables
+    et les nouveaux termes ajoutés à la fin. Les postings sont ensuite
+    retriés en un seul passage NumPy et le dossier est publié d'un bloc.
+    rebuild repart de zéro (vocabulaire compacté).
+    
+    Returns:
+        Statistiques : chunks, termes, chunks réutilisés / tokenisés, durée
+    """
+    path = path or bm25_path(chunks_path)
+    start = time.time()
+    source = _source_state(chunks_path)
+    
+    # Index existant : vocabulaire et index direct réutilisables
+    terms: List[str] = []
+    previous = None
+    if not rebuild and os.path.exists(os.path.join(path, 'bm25.json')):
+        with open(os.path.join(path, 'bm25.json'), 'r', encoding='utf-8') as f:
+            previous_meta = json.load(f)
+        if previous_meta.get('version') == BM25_VERSION:
+            with open(os.path.join(path, 'terms.json'), 'r', encoding='utf-8') as f:
+                terms = json.load(f)
+            with open(os.path.join(path, 'doc_hashes.md5'), 'rb') as f:
+                hashes = f.read()
+            previous = {
+                'rows': {hashes[i:i + 16]: i // 16 for i in range(0, len(hashes), 16)},
+                'terms': np.fromfile(os.path.join(path, 'doc_terms.u32'), dtype=np.uint32),
+                'tfs': np.fromfile(os.path.join(path, 'doc_tfs.u16'), dtype=np.uint16),
+                'offsets': np.fromfile(os.path.join(path, 'doc_offsets.u64'),
+                                       dtype=np.uint64).astype(np.int64)
+            }
+    term_ids = {term: i for i, term in enumerate(terms)}
+    
+    doc_terms = []
+    doc_tfs = []
+    doc_hashes = []
+    reused = 0
+    chunks = ChunkStore(chunks_path)
+    for content in chunks.iter_field('content'):
+        digest = hashlib.md5(content.encode('utf-8')).digest()
+        doc_hashes.append(digest)
+        row = previous['rows'].get(digest) if previous else None
+        if row is not None:
+            a, z = previous['offsets'][row], previous['offsets'][row + 1]
+            doc_terms.append(previous['terms'][a:z])
+            doc_tfs.append(previous['tfs'][a:z])
+            reused += 1
+            continue
+        counts = Counter(tokenize(content))
+        ids = np.empty(len(counts), dtype=np.uint32)
+        for i, term in enumerate(counts):
+            if term not in term_ids:
+                term_ids[term] = len(terms)
+                terms.append(term)
+            ids[i] = term_ids[term]
+        order = np.argsort(ids)
+        doc_terms.append(ids[order])
+        doc_tfs.append(np.minimum(np.fromiter(counts.values(), dtype=np.int64,
+                                              count=len(counts)), _MAX_TF)[order].astype(np.uint16))
+    chunks.close()
+    
+    n_docs = len(doc_hashes)
+    lengths = np.array([len(t) for t in doc_terms], dtype=np.int64)
+    doc_offsets = np.zeros(n_docs + 1, dtype=np.uint64)
+    doc_offsets[1:] = np.cumsum(lengths)
+    forward_terms = np.concatenate(doc_terms) if n_docs else np.zeros(0, dtype=np.uint32)
+    forward_tfs = np.concatenate(doc_tfs) if n_docs else np.zeros(0, dtype=np.uint16)
+    doc_ids = np.repeat(np.arange(n_docs, dtype=np.uint32), lengths)
+    doc_lengths = np.array([int(t.sum(dtype=np.int64)) for t in doc_tfs], dtype=np.uint32)
+    
+    # Index inversé : tri par terme, chunks croissants dans chaque liste
+    order = np.lexsort((doc_ids, forward_terms))
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+    term_offsets[1:] = np.cumsum(np.bincount(forward_terms, minlength=len(terms)))
+    postings_docs = doc_ids[order]
+    postings_tfs = forward_tfs[order]
+    
+    # Borne supérieure de la contribution de chaque terme (0 pour un terme sans postings)
+    avg_length = float(doc_lengths.mean()) if n_docs else 0.0
+    term_max = np.zeros(len(terms), dtype=np.float32)
+    if len(postings_docs):
+        tf = postings_tfs.astype(np.float32)
+        contributions = tf * (k1 + 1) / (tf + length_norm(doc_lengths, avg_length, k1, b)[postings_docs])
+        present = np.flatnonzero(np.diff(term_offsets) > 0)
+        term_max[present] = np.maximum.reduceat(contributions, term_offsets[present].astype(np.int64))
+        term_max *= idf(np.diff(term_offsets), n_docs)
+    
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    try:
+        with open(os.path.join(tmp_path, 'terms.json'), 'w', encoding='utf-8') as f:
+            json.dump(terms, f, ensure_ascii=False)
+        postings_docs.tofile(os.path.join(tmp_path, 'postings_docs.u32'))
+        postings_tfs.tofile(os.path.join(tmp_path, 'postings_tf.u16'))
+        term_max.tofile(os.path.join(tmp_path, 'term_max.f32'))
+        term_offsets.tofile(os.path.join(tmp_path, 'term_offsets.u64'))
+        doc_lengths.tofile(os.path.join(tmp_path, 'doc_lengths.u32'))
+        forward_terms.tofile(os.path.join(tmp_path, 'doc_terms.u32'))
+        forward_tfs.tofile(os.path.join(tmp_path, 'doc_tfs.u16'))
+        doc_offsets.tofile(os.path.join(tmp_path, 'doc_offsets.u64'))
+        with open(os.path.join(tmp_path, 'doc_hashes.md5'), 'wb') as f:
+            f.write(b''.join(doc_hashes))
+        stats = {
+            'version': BM25_VERSION,
+            'n_docs': n_docs,
+            'n_terms': len(terms),
+            'n_postings': int(len(forward_terms)),
+            'avg_doc_length': avg_length,
+            'k1': k1,
+            'b': b,
+            'source': source
+        }
+        with open(os.path.join(tmp_path, 'bm25.json'), 'w', encoding='utf-8') as f:
+            json.dump(stats, f)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    _publish(tmp_path, path)
+    
+    return {
+        'docs': n_docs,
+        'terms': len(terms),
+        'reused': reused,
+        'tokenized': n_docs - reused,
+        'build_seconds': round(time.time() - start, 2)
+    }
+
+
+def open_bm25(chunks_path: str = CHUNKS_FILE) -> 'BM25Index':
+    """Ouvre l'index BM25 d'un chunk store, mis à jour au préalable s'il est périmé"""
+    if not bm25_is_current(chunks_path):
+        stats = build_bm25(chunks_path)
+        print(f"   ✅ BM25 index updated: {stats['docs']} chunks, {stats['terms']} terms "
+              f"({stats['tokenized']} tokenized) in {stats['build_seconds']}s")
+    return BM25Index(bm25_path(chunks_path))
+
+
+class BM25Index:
+    """
+    Recherche BM25 sur un index inversé mappé en mémoire
+    
+    L'ouverture ne lit que le vocabulaire et les bornes des listes ; les
+    postings ne sont touchés que pour les termes de la requête. Le score
+    d'un chunk est la somme, sur les termes de la requête, de
+    idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * longueur / longueur moyenne)).
+    
+    top_k élague à la MaxScore : les termes sont développés par borne
+    décroissante et seuls les chunks de leurs listes sont scorés ; dès
+    que la somme des bornes des termes restants ne dépasse plus le k-ième
+    score du tas, aucun chunk non vu ne peut entrer dans le top-k et la
+    recherche s'arrête. Un candidat est abandonné dès que son score
+    partiel plus les bornes restantes ne peut plus atteindre ce seuil.
+    Le coût dépend des listes des termes de la requête, pas du corpus.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'bm25.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        with open(os.path.join(path, 'terms.json'), 'r', encoding='utf-8') as f:
+            self.term_ids = {term: i for i, term in enumerate(json.load(f))}
+        self.k1 = self.meta['k1']
+        self.b = self.meta['b']
+        n_docs, n_postings = self.meta['n_docs'], self.meta['n_postings']
+        
+        self.term_offsets = np.fromfile(os.path.join(path, 'term_offsets.u64'),
+                                        dtype=np.uint64).astype(np.int64)
+        self.docs = self._map('postings_docs.u32', np.uint32, n_postings)
+        self.tfs = self._map('postings_tf.u16', np.uint16, n_postings)
+        doc_lengths = self._map('doc_lengths.u32', np.uint32, n_docs)
+        
+        self.term_max = np.fromfile(os.path.join(path, 'term_max.f32'), dtype=np.float32)
+        self.idf = idf(np.diff(self.term_offsets), n_docs)
+        self.length_norm = length_norm(doc_lengths, self.meta['avg_doc_length'], self.k1, self.b)
+    
+    def _map(self, name: str, dtype, count: int) -> np.ndarray:
+        if not count:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode='r', shape=(count,))
+    
+    def __len__(self) -> int:
+        return self.meta['n_docs']
+    
+    def query_terms(self, query: str) -> List[int]:
+        """Identifiants des termes connus de la requête (sans doublons)"""
+        return sorted({self.term_ids[t] for t in tokenize(query) if t in self.term_ids})
+    
+    @staticmethod
+    def _contains(sorted_values: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Masque des values présentes dans sorted_values (recherche binaire)"""
+        if not len(sorted_values):
+            return np.zeros(len(values), dtype=bool)
+        positions = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+        return sorted_values[positions] == values
+    
+    def _score(self, candidates: np.ndarray, lists: List[Tuple[int, int, int]],
+               remaining: np.ndarray, threshold: float) -> np.ndarray:
+        """
+        Scores complets des candidats, termes par borne décroissante ; un
+        candidat qui ne peut plus dépasser threshold n'est plus cherché
+        dans les listes suivantes (son score partiel reste <= threshold)
+        """
+        scores = np.zeros(len(candidates), dtype=np.float32)
+        alive = np.arange(len(candidates))
+        for j, (term, a, z) in enumerate(lists):
+            docs = self.docs[a:z]
+            wanted = candidates[alive]
+            positions = np.minimum(np.searchsorted(docs, wanted), len(docs) - 1)
+            found = docs[positions] == wanted
+            tf = self.tfs[a + positions[found]].astype(np.float32)
+            matched = wanted[found]
+            scores[alive[found]] += self.idf[term] * tf * (self.k1 + 1) / \
+                (tf + self.length_norm[matched])
+            if threshold > 0 and j + 1 < len(lists):
+                alive = alive[scores[alive] + remaining[j + 1] > threshold]
+                if not len(alive):
+                    break
+        return scores
+    
+    def top_k(self, query: str, top_k: int = 5, rows: Optional[np.ndarray] = None,
+              start: int = 0, end: Optional[int] = None):
+        """
+        Top-k BM25 (parmi rows triés, ou les chunks de [start, end))
+        
+        Returns:
+            (rows, scores) triés par score décroissant, scores > 0 uniquement
+        """
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        end = len(self) if end is None else end
+        terms = self.query_terms(query)
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+        if not terms or top_k <= 0 or end <= start or (rows is not None and not len(rows)):
+            return empty
+        
+        # Listes des termes, réduites à [start, end) par recherche binaire (postings triés)
+        lists = []
+        for term in terms:
+            a, z = int(self.term_offsets[term]), int(self.term_offsets[term + 1])
+            if start or end < len(self):
+                docs = self.docs[a:z]
+                a, z = a + int(np.searchsorted(docs, start)), a + int(np.searchsorted(docs, end))
+            if z > a:
+                lists.append((term, a, z))
+        if not lists:
+            return empty
+        lists.sort(key=lambda entry: -self.term_max[entry[0]])
+        # remaining[j] : score maximal d'un chunk absent des listes 0..j-1
+        bounds = np.array([self.term_max[term] for term, _, _ in lists], dtype=np.float32)
+        remaining = np.append(np.cumsum(bounds[::-1])[::-1], 0.0).astype(np.float32)
+        
+        heap = []  # (score, row), tas min borné à top_k
+        threshold = 0.0
+        for i, (term, a, z) in enumerate(lists):
+            if len(heap) == top_k and remaining[i] <= threshold:
+                break
+            candidates = self.docs[a:z].astype(np.int64)
+            if rows is not None:
+                candidates = candidates[self._contains(rows, candidates)]
+            # Déjà scorés : présents dans une liste développée avant
+            for _, seen_a, seen_z in lists[:i]:
+                if not len(candidates):
+                    break
+                candidates = candidates[~self._contains(self.docs[seen_a:seen_z], candidates)]
+            if not len(candidates):
+                continue
+            
+            scores = self._score(candidates, lists, remaining, threshold)
+            better = np.flatnonzero(scores > threshold)
+            if len(better) > top_k:
+                better = better[np.argpartition(-scores[better], top_k - 1)[:top_k]]
+            for position in better:
+                entry = (float(scores[position]), int(candidates[position]))
+                if len(heap) < top_k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+            if len(heap) == top_k:
+                threshold = heap[0][0]
+        
+        if not heap:
+            return empty
+        ranked = sorted(heap, key=lambda entry: (-entry[0], entry[1]))
+        return (np.array([row for _, row in ranked], dtype=np.int64),
+                np.array([score for score, _ in ranked], dtype=np.float32))
+    
+    def scores(self, query: str):
+        """
+        Scores BM25 de tous les chunks qui contiennent un terme de la
+        requête, sans élagage (pour filtrer ensuite par lignes)
+        
+        Returns:
+            (rows, scores), rows croissants
+        """
+        rows, scores = [], []
+        for term in self.query_terms(query):
+            a, z = int(self.term_offsets[term]), int(self.term_offsets[term + 1])
+            if z > a:
+                docs = self.docs[a:z].astype(np.int64)
+                tf = self.tfs[a:z].astype(np.float32)
+                rows.append(docs)
+                scores.append(self.idf[term] * tf * (self.k1 + 1) / (tf + self.length_norm[docs]))
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        unique, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        return unique, np.bincount(inverse, weights=np.concatenate(scores)).astype(np.float32)
+    
+    def close(self):
+        """Libère les fichiers mappés"""
+        self.docs = None
+        self.tfs = None
+
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Build or update the BM25 index of the chunk store")
+    parser.add_argument('--chunks', default=CHUNKS_FILE)
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Rebuild from scratch instead of reusing unchanged chunks")
+    args = parser.parse_args()
+    
+    stats = build_bm25(args.chunks, rebuild=args.rebuild)
+    print(f"✅ BM25 index: {stats['docs']} chunks, {stats['terms']} terms, "
+          f"{stats['reused']} reused / {stats['tokenized']} tokenized in {stats['build_seconds']}s")
@@ -0,0 +1,55 @@
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from dense_index import normalize
+
+DEFAULT_MIN_SIMILARITY = 0.35
+DEFAULT_MIN_MARGIN = 0.05
+
+
+class CategoryRouter:
+    """
+    Routeur léger requête -> catégorie
+    
+    L'embedding de la requête est comparé au vecteur résumé (centroïde
+    normalisé) de chaque catégorie. Une catégorie n'est retenue que si
+    elle est assez proche et nettement devant la suivante ; sinon la
+    recherche reste globale.
+    
+    project ramène la requête dans l'espace des centroïdes quand l'index
+    dense stocke des vecteurs réduits (PCA).
+    """
+    
+    def __init__(self, categories: List[str], centroids: np.ndarray,
+                 min_similarity: float = DEFAULT_MIN_SIMILARITY,
+                 min_margin: float = DEFAULT_MIN_MARGIN,
+                 project: Optional[Callable] = None):
+        self.categories = list(categories)
+        self.centroids = normalize(centroids) if len(categories) else centroids
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.project = project or normalize
+    
+    @classmethod
+    def from_dense_index(cls, dense_index, **kwargs) -> Optional['CategoryRouter']:
+        """Routeur construit sur les partitions par catégorie d'un NumpyDenseIndex (None si < 2 catégories)"""
+        if not hasattr(dense_index, 'category_centroids'):
+            return None
+        categories, centroids = dense_index.category_centroids()
+        if len(categories) < 2:
+            return None
+        return cls(categories, centroids, project=dense_index.project, **kwargs)
+    
+    def scores(self, query_embedding) -> Dict[str, float]:
+        """Similarité cosinus de la requête avec chaque catégorie"""
+        similarities = self.centroids @ self.project(query_embedding)[0]
+        return {category: float(s) for category, s in zip(self.categories, similarities)}
+    
+    def route(self, query_embedding) -> Optional[str]:
+        """Catégorie de la requête, ou None si aucune ne se détache"""
+        similarities = self.centroids @ self.project(query_embedding)[0]
+        order = np.argsort(-similarities)
+        best = similarities[order[0]]
+        runner_up = similarities[order[1]] if len(order) > 1 else -1.0
+        if best < self.min_similarity or best - runner_up < self.min_margin:
+            return None
+        return self.categories[order[0]]
@@ -31,11 +31,12 @@ class WikiChatbot:
         return [{'role': msg['role'], 'content': msg['content']} for msg in history]
 
 
-    def query(self, user_query: str, session_id: Optional[str] = None) -> Dict:
+    def query(self, user_query: str, session_id: Optional[str] = None,
+              category: Optional[str] = None) -> Dict:
         
         # --- RAG RETRIEVAL ---
-        # 1. Perform RAG search on the NEW user query
-        retrieval_result = self.rag.search(user_query)
+        # 1. Perform RAG search on the NEW user query (restricted to `category` if given)
+        retrieval_result = self.rag.search(user_query, category=category)
         
         # 🎯 FIX FOR ATTRIBUTE ERROR (list.get):
         # Assuming RAGPipeline.search() has been fixed to return a dictionary, 
@@ -90,6 +91,7 @@ class WikiChatbot:
                 'answer': response['message']['content'],
                 'sources': sources,
                 'type': retrieval_result.get('type', 'hybrid_rag'),
+                'category': retrieval_result.get('category'),
             }
         except Exception as e:
             logger.error(f"Ollama inference failed: {e}")
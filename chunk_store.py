@@ -0,0 +1,241 @@
+import os
+import json
+import mmap
+import struct
+import hashlib
+from typing import Dict, Iterator, List
+import numpy as np
+
+# Format des chunks : un objet JSON par ligne (chunks.jsonl) + un index
+# binaire d'offsets (chunks.jsonl.idx, un uint64 little-endian par chunk).
+# L'index permet de lire le chunk i sans parser tout le corpus.
+# chunks.jsonl.keys : hash 64 bits du chunk_key de chaque chunk (uint64
+# little-endian, 0 si le chunk n'a pas de source / chunk_id), pour
+# retrouver la ligne d'un ID de chunk sans parser le corpus.
+CHUNKS_FILE = 'processed_wiki/chunks.jsonl'
+SMART_CHUNKS_FILE = 'processed_wiki/chunks_smart.jsonl'
+
+_OFFSET = struct.Struct('<Q')
+_KEY = struct.Struct('<Q')
+
+
+def index_path(path: str) -> str:
+    """Chemin du fichier d'offsets associé à un fichier .jsonl"""
+    return path + '.idx'
+
+
+def keys_path(path: str) -> str:
+    """Chemin du fichier des hash de chunk_key associé à un fichier .jsonl"""
+    return path + '.keys'
+
+
+def key_hash(key: str) -> int:
+    """Hash 64 bits d'un chunk_key (blake2b)"""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _chunk_hash(chunk: Dict) -> int:
+    if 'source' not in chunk or 'chunk_id' not in chunk:
+        return 0
+    return key_hash(chunk_key(chunk))
+
+
+def chunk_key(chunk: Dict) -> str:
+    """ID stable d'un chunk (fichier source + position dans le fichier)"""
+    return f"{chunk['source']}::{chunk['chunk_id']}"
+
+
+class ChunkWriter:
+    """
+    Écrit les chunks au fil de l'eau en JSONL + index d'offsets
+    
+    Les fichiers sont écrits en .tmp puis renommés à la fermeture, les
+    lecteurs ne voient donc jamais un fichier à moitié écrit. Avec keys,
+    le fichier .keys (hash des chunk_key) est écrit en même temps.
+    """
+    
+    def __init__(self, path: str = CHUNKS_FILE, keys: bool = True):
+        self.path = path
+        self.count = 0
+        self._data = open(path + '.tmp', 'wb')
+        self._index = open(index_path(path) + '.tmp', 'wb')
+        self._keys = open(keys_path(path) + '.tmp', 'wb') if keys else None
+    
+    def write(self, chunk: Dict):
+        """Ajoute un chunk à la fin du fichier"""
+        line = json.dumps(chunk, ensure_ascii=False).encode('utf-8') + b'\n'
+        self._index.write(_OFFSET.pack(self._data.tell()))
+        self._data.write(line)
+        if self._keys is not None:
+            self._keys.write(_KEY.pack(_chunk_hash(chunk)))
+        self.count += 1
+    
+    def close(self):
+        """Termine l'écriture et publie les fichiers"""
+        if self._data.closed:
+            return
+        self._data.close()
+        self._index.close()
+        if self._keys is not None:
+            self._keys.close()
+            os.replace(keys_path(self.path) + '.tmp', keys_path(self.path))
+        os.replace(self.path + '.tmp', self.path)
+        os.replace(index_path(self.path) + '.tmp', index_path(self.path))
+    
+    def abort(self):
+        """Abandonne l'écriture sans toucher aux fichiers existants"""
+        if self._data.closed:
+            return
+        self._data.close()
+        self._index.close()
+        os.remove(self.path + '.tmp')
+        os.remove(index_path(self.path) + '.tmp')
+        if self._keys is not None:
+            self._keys.close()
+            os.remove(keys_path(self.path) + '.tmp')
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def rebuild_index(path: str) -> int:
+    """Reconstruit l'index d'offsets d'un fichier .jsonl (une ligne par chunk), retourne le nombre de chunks"""
+    count = 0
+    with open(path, 'rb') as data, open(index_path(path) + '.tmp', 'wb') as index:
+        offset = 0
+        for line in data:
+            index.write(_OFFSET.pack(offset))
+            offset += len(line)
+            count += 1
+    os.replace(index_path(path) + '.tmp', index_path(path))
+    return count
+
+
+def write_chunks(chunks, path: str = CHUNKS_FILE) -> int:
+    """Écrit une liste (ou un itérable) de chunks, retourne le nombre écrit"""
+    with ChunkWriter(path) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return writer.count
+
+
+class ChunkStore:
+    """
+    Accès paresseux aux chunks d'un fichier JSONL
+    
+    L'ouverture ne lit rien : les fichiers sont mappés en mémoire et
+    chaque chunk n'est parsé que lorsqu'on y accède. Si seul l'ancien
+    format (.json indenté) existe, il est chargé en entier.
+    """
+    
+    def __init__(self, path: str = CHUNKS_FILE):
+        self.path = path
+        self._legacy = None
+        self._data = None
+        self._offsets = None
+        self._count = 0
+        # (hash triés, lignes) des chunk_key, chargés au premier rows_of
+        self._key_rows = None
+        
+        if not os.path.exists(path):
+            legacy_path = os.path.splitext(path)[0] + '.json'
+            if not os.path.exists(legacy_path):
+                raise FileNotFoundError(
+                    f"{path} not found, run 'python wiki_processor.py' first"
+                )
+            with open(legacy_path, 'r', encoding='utf-8') as f:
+                self._legacy = json.load(f)
+            self.path = legacy_path
+            return
+        
+        self._count = os.path.getsize(index_path(path)) // _OFFSET.size
+        if self._count == 0:
+            return
+        
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(index_path(path), 'rb') as f:
+            self._offsets = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    def __len__(self) -> int:
+        if self._legacy is not None:
+            return len(self._legacy)
+        return self._count
+    
+    def _span(self, i: int):
+        start = _OFFSET.unpack_from(self._offsets, i * _OFFSET.size)[0]
+        if i + 1 < self._count:
+            end = _OFFSET.unpack_from(self._offsets, (i + 1) * _OFFSET.size)[0]
+        else:
+            end = len(self._data)
+        return start, end
+    
+    def __getitem__(self, i: int) -> Dict:
+        if self._legacy is not None:
+            return self._legacy[i]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(f"chunk index {i} out of range")
+        start, end = self._span(i)
+        return json.loads(self._data[start:end])
+    
+    def __iter__(self) -> Iterator[Dict]:
+        if self._legacy is not None:
+            yield from self._legacy
+            return
+        for i in range(self._count):
+            yield self[i]
+    
+    def get_many(self, indices) -> List[Dict]:
+        """Lit plusieurs chunks par leur position"""
+        return [self[int(i)] for i in indices]
+    
+    def rows_of(self, keys: List[str]) -> np.ndarray:
+        """Lignes des chunks d'IDs donnés (chunk_key), -1 pour un ID absent"""
+        if self._key_rows is None:
+            self._load_keys()
+        hashes, rows = self._key_rows
+        wanted = np.array([key_hash(key) for key in keys], dtype=np.uint64)
+        if not len(hashes):
+            return np.full(len(wanted), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(hashes, wanted), len(hashes) - 1)
+        return np.where(hashes[positions] == wanted, rows[positions], -1)
+    
+    def _load_keys(self):
+        """Charge le fichier .keys (calculé et écrit une fois s'il manque)"""
+        path = keys_path(self.path)
+        if self._legacy is None and os.path.exists(path) and \
+                os.path.getsize(path) == self._count * _KEY.size:
+            hashes = np.fromfile(path, dtype='<u8')
+        else:
+            # Store écrit avant l'ajout du fichier .keys : un seul parcours
+            print(f"   Indexing chunk IDs of {self.path}...")
+            hashes = np.array([_chunk_hash(chunk) for chunk in self], dtype=np.uint64)
+            if self._legacy is None:
+                try:
+                    hashes.astype('<u8').tofile(path + '.tmp')
+                    os.replace(path + '.tmp', path)
+                except OSError:
+                    pass
+        order = np.argsort(hashes, kind='stable')
+        self._key_rows = (hashes[order], order.astype(np.int64))
+    
+    def iter_field(self, field: str) -> Iterator:
+        """Itère sur un seul champ de chaque chunk (ex: 'content')"""
+        for chunk in self:
+            yield chunk[field]
+    
+    def close(self):
+        """Libère les fichiers mappés"""
+        if self._data is not None:
+            self._data.close()
+            self._offsets.close()
+            self._data = None
+            self._offsets = None
@@ -4,23 +4,34 @@ from typing import List
 import pickle
 import os
 import json
+from chunk_store import ChunkStore, SMART_CHUNKS_FILE
+from embedding_batcher import EmbeddingBatcher
+from embedding_cache import EmbeddingCache
+from ingest import (pipelined_ingest, print_ingest_summary, verify_collection,
+                    IngestCheckpoint, job_fingerprint, hnsw_metadata, DEFAULT_BATCH_SIZE)
+
+CHECKPOINT_FILE = "processed_wiki/vector_store_checkpoint.json"
 
 def load_chunks() -> List[str]:
-    """Load chunks from JSON file (processed_wiki/chunks_smart.json)"""
-    chunks_path = "processed_wiki/chunks_smart.json"
+    """Load chunks from JSONL chunk store (processed_wiki/chunks_smart.jsonl)"""
+    chunks_path = SMART_CHUNKS_FILE
 
-    if not os.path.exists(chunks_path):
-        print("⚠️ Fichier JSON introuvable :", chunks_path)
+    try:
+        data = ChunkStore(chunks_path)
+    except FileNotFoundError:
+        print("⚠️ Fichier de chunks introuvable :", chunks_path)
         return []
 
-    with open(chunks_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    if len(data) == 0:
+        print("⚠️ Aucun chunk dans", chunks_path)
+        return []
 
     # Extraire la bonne clé ('content' ou 'text')
-    if isinstance(data, list) and isinstance(data[0], dict) and "content" in data[0]:
-        chunks = [chunk["content"] for chunk in data]
-    elif isinstance(data, list) and isinstance(data[0], dict) and "text" in data[0]:
-        chunks = [chunk["text"] for chunk in data]
+    first = data[0]
+    if isinstance(first, dict) and "content" in first:
+        chunks = list(data.iter_field("content"))
+    elif isinstance(first, dict) and "text" in first:
+        chunks = list(data.iter_field("text"))
     else:
         print("⚠️ Format inattendu du JSON (aucune clé 'content' ou 'text' trouvée).")
         return []
@@ -40,7 +51,7 @@ def load_chunks() -> List[str]:
     return chunks
 
 
-def create_vector_store():
+def create_vector_store(batch_size: int = DEFAULT_BATCH_SIZE):
     print("Creating Vector Store...")
     
     # 1. Load chunks
@@ -57,7 +68,7 @@ def create_vector_store():
         # Get or create collection
         collection = client.get_or_create_collection(
             name="wiki_documents",
-            metadata={"hnsw:space": "cosine"}
+            metadata=hnsw_metadata({"hnsw:space": "cosine"})
         )
         print("   ✅ Chroma initialized")
         
@@ -69,6 +80,7 @@ def create_vector_store():
     print("3. Initializing embedding model...")
     try:
         model = SentenceTransformer('all-MiniLM-L6-v2')
+        cache = EmbeddingCache('all-MiniLM-L6-v2')
         print("   ✅ Embedding model loaded")
     except Exception as e:
         print(f"   ❌ Error loading model: {e}")
@@ -77,37 +89,60 @@ def create_vector_store():
     # 4. Add chunks to vector store
     print("4. Adding chunks to vector store...")
     try:
-        for i, chunk in enumerate(chunks):
-            # Generate embedding
-            embedding = model.encode(chunk, convert_to_tensor=False).tolist()
-            
-            # Add to collection
-            collection.add(
-                ids=[f"chunk_{i}"],
-                documents=[chunk],
-                embeddings=[embedding],
-                metadatas=[{"source": "wiki_document"}]
-            )
-            
-            if (i + 1) % 5 == 0:
-                print(f"   📝 Processed {i + 1}/{len(chunks)} chunks")
+        records = [
+            (f"chunk_{i}", chunk, {"source": "wiki_document"})
+            for i, chunk in enumerate(chunks)
+        ]
+        
+        # Reprise après crash : les lots déjà validés ne sont pas ré-encodés
+        checkpoint = IngestCheckpoint(CHECKPOINT_FILE)
+        total_batches = (len(records) + batch_size - 1) // batch_size
+        committed = checkpoint.start(job_fingerprint(records, batch_size), total_batches)
+        if committed:
+            print(f"   ⏩ Resuming after batch {committed}/{total_batches}")
+        
+        # Encode du lot N+1 pendant l'écriture Chroma du lot N.
+        # Upsert : un lot écrit mais pas encore validé peut être rejoué sans doublon
+        stats = pipelined_ingest(
+            collection,
+            records,
+            encode=EmbeddingBatcher(model, cache=cache).encode,
+            batch_size=batch_size,
+            upsert=True,
+            checkpoint=checkpoint,
+            skip_batches=committed
+        )
         
         print(f"   ✅ Added all {len(chunks)} chunks to vector store")
+        print_ingest_summary(stats)
+        print(f"      {cache.summary()}")
         
     except Exception as e:
         print(f"   ❌ Error adding chunks: {e}")
         raise
     
-    # 5. Persist the collection
-    print("5. Persisting vector store...")
-    try:
-        # PersistentClient automatically saves to disk
-        print("   ✅ Vector store persisted to ./chroma_data")
-    except Exception as e:
-        print(f"   ❌ Error persisting: {e}")
-        raise
+    # 5. Verify the collection against the source chunks
+    print("5. Verifying vector store...")
+    # PersistentClient automatically saves to disk
+    missing = verify_collection(collection, [record[0] for record in records], batch_size)
+    count = collection.count()
+    if missing:
+        print(f"   ❌ {len(missing)} chunks missing from the collection (first: {missing[:5]})")
+        checkpoint.clear()
+        raise RuntimeError("Vector store verification failed, run again to re-ingest")
+    checkpoint.clear()
+    print(f"   ✅ {len(records)}/{len(records)} chunks present in ./chroma_data")
+    if count > len(records):
+        print(f"   ⚠️  Collection holds {count - len(records)} extra chunks from earlier runs")
     
     print("\n✨ Vector store created successfully!")
 
 if __name__ == "__main__":
-    create_vector_store()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Embed chunks_smart into the wiki_documents collection")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Chunks per encode/write batch")
+    args = parser.parse_args()
+    
+    create_vector_store(batch_size=args.batch_size)
\ No newline at end of file
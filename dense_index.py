@@ -0,0 +1,645 @@
+import os
+import re
+import json
+import shutil
+from typing import Dict, List, Optional
+import numpy as np
+from chunk_store import ChunkStore, ChunkWriter
+from ivf_index import IVFIndex, write_partitions
+from ingest import collection_stamp
+
+# Index denses exportés depuis Chroma : un dossier par (base Chroma, collection)
+DENSE_INDEX_DIR = './dense_index'
+DEFAULT_DENSE_BACKEND = 'numpy'
+DENSE_BACKENDS = ('numpy', 'chroma')
+
+# Stockage des vecteurs parcourus à chaque requête (float32 = exact)
+DENSE_PRECISIONS = ('float32', 'float16', 'int8')
+DEFAULT_DENSE_PRECISION = 'float32'
+# Candidats rescorés en float32 : rescore_factor * top_k
+DEFAULT_RESCORE_FACTOR = 4
+# Lignes dé-quantifiées à la fois pendant le parcours (borne la mémoire temporaire)
+_SCAN_BLOCK = 16384
+_CODES_FILES = {'float16': 'vectors.f16', 'int8': 'vectors.i8'}
+
+# Préfiltre binaire : 1 bit de signe par dimension, distance de Hamming
+DENSE_PREFILTERS = (None, 'binary')
+DEFAULT_PREFILTER_CANDIDATES = 256
+_BINARY_FILE = 'binary.u64'
+# Popcount d'un octet, si np.bitwise_count (NumPy >= 2.0) est absent
+_POPCOUNT_8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+# Partitions par valeur de metadata : par document source (recherche
+# hiérarchique, fichiers doc_*) et par catégorie (pré-filtrage, fichiers cat_*)
+PARTITION_PREFIXES = {'source': 'doc', 'category': 'cat'}
+
+# Réduction de dimension (PCA) : moyenne puis composantes, float32
+_PROJECTION_FILE = 'projection.f32'
+
+
+def dense_index_path(collection_name: str, persist_directory: str = './chroma_data') -> str:
+    """Dossier de l'index dense d'une collection Chroma"""
+    store = re.sub(r'[^A-Za-z0-9_.-]+', '_', os.path.basename(os.path.normpath(persist_directory)))
+    return os.path.join(DENSE_INDEX_DIR, store, collection_name)
+
+
+def normalize(vectors) -> np.ndarray:
+    """Normalise chaque ligne en L2 (float32, les vecteurs nuls restent nuls)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize(vectors: np.ndarray, precision: str):
+    """
+    Quantifie des vecteurs normalisés
+    
+    Returns:
+        (codes, scales) : scales est None en float16, sinon un facteur
+        float32 par vecteur tel que vecteur ≈ codes * scale
+    """
+    if precision == 'float16':
+        return vectors.astype(np.float16), None
+    if precision == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unknown precision '{precision}', expected one of {DENSE_PRECISIONS}")
+
+
+def binary_codes(vectors: np.ndarray) -> np.ndarray:
+    """Codes binaires (bit de signe de chaque dimension) empaquetés en uint64"""
+    packed = np.packbits(np.asarray(vectors) > 0, axis=1)
+    padding = -packed.shape[1] % 8
+    if padding:
+        packed = np.pad(packed, ((0, 0), (0, padding)))
+    return np.ascontiguousarray(packed).view('<u8')
+
+
+def hamming_distances(codes: np.ndarray, query_code: np.ndarray) -> np.ndarray:
+    """Distance de Hamming entre chaque ligne de codes et un code requête"""
+    xor = np.bitwise_xor(codes, query_code)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(xor).sum(axis=1, dtype=np.uint32)
+    return _POPCOUNT_8[xor.view(np.uint8)].sum(axis=1, dtype=np.uint32)
+
+
+def fit_pca(vectors: np.ndarray, dims: int):
+    """
+    PCA exacte sur des vecteurs normalisés, covariance accumulée par blocs
+    
+    Returns:
+        (mean, components, explained) : moyenne (dim,), composantes
+        principales (dims, dim) et part de variance conservée
+    """
+    count, dim = vectors.shape
+    if not 0 < dims < dim:
+        raise ValueError(f"Reduced dimension must be between 1 and {dim - 1}, got {dims}")
+    total = np.zeros(dim, dtype=np.float64)
+    scatter = np.zeros((dim, dim), dtype=np.float64)
+    for start in range(0, count, _SCAN_BLOCK):
+        block = np.asarray(vectors[start:start + _SCAN_BLOCK], dtype=np.float64)
+        total += block.sum(axis=0)
+        scatter += block.T @ block
+    mean = total / count
+    covariance = scatter / count - np.outer(mean, mean)
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    order = np.argsort(-eigenvalues)[:dims]
+    explained = float(eigenvalues[order].sum() / max(eigenvalues.sum(), 1e-12))
+    return (mean.astype(np.float32), eigenvectors[:, order].T.astype(np.float32),
+            round(explained, 4))
+
+
+def project(vectors, mean: np.ndarray, components: np.ndarray) -> np.ndarray:
+    """Projette des vecteurs (normalisés) dans l'espace réduit, puis renormalise"""
+    return normalize((normalize(vectors) - mean) @ components.T)
+
+
+def _publish(tmp_path: str, path: str):
+    """Remplace le dossier path par tmp_path (les lecteurs ouverts gardent l'ancien)"""
+    old_path = path + '.old'
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def export_collection(collection, path: str, model_name: Optional[str] = None,
+                      batch_size: int = 1000,
+                      precision: str = DEFAULT_DENSE_PRECISION,
+                      dims: Optional[int] = None) -> int:
+    """
+    Exporte les embeddings, documents et metadata d'une collection Chroma
+    vers un index dense NumPy
+    
+    Le dossier contient :
+      - vectors.f32 : matrice float32 (n, dim) normalisée L2, lue en memmap
+      - vectors.f16 / vectors.i8 (+ scales.f32) : copie quantifiée parcourue
+        à chaque requête si precision vaut 'float16' ou 'int8'
+      - binary.u64 : codes binaires (bits de signe) du préfiltre de Hamming
+      - payloads.jsonl (+ .idx) : {'id', 'document', 'metadata'} de la ligne i
+      - projection.f32 : moyenne et composantes PCA si dims est donné
+      - meta.json : modèle, dimension, nombre de vecteurs, précision,
+        réduction et tampon de la collection exportée (ingest.collection_stamp)
+    
+    Avec dims, une PCA est ajustée sur tout le corpus et les vecteurs sont
+    stockés projetés en dims dimensions (renormalisés) ; les requêtes sont
+    projetées de la même façon par NumpyDenseIndex. Les copies quantifiées
+    et les codes binaires sont dérivés des vecteurs stockés.
+    
+    Returns:
+        Nombre de vecteurs exportés
+    """
+    if precision not in DENSE_PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {DENSE_PRECISIONS}")
+    
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    
+    # Tampon lu avant la collection : une écriture pendant l'export le change
+    stamp = collection_stamp(collection)
+    count = 0
+    dim = None
+    reduction = None
+    vectors_path = os.path.join(tmp_path, 'vectors.f32')
+    full_path = os.path.join(tmp_path, 'full.f32') if dims else vectors_path
+    try:
+        with open(full_path, 'wb') as vectors_file, \
+                ChunkWriter(os.path.join(tmp_path, 'payloads.jsonl'), keys=False) as payloads:
+            # Lecture paginée : la collection n'est jamais chargée en entier
+            offset = 0
+            while True:
+                page = collection.get(include=['embeddings', 'documents', 'metadatas'],
+                                      limit=batch_size, offset=offset)
+                if not page['ids']:
+                    break
+                vectors = normalize(page['embeddings'])
+                dim = vectors.shape[1]
+                vectors_file.write(vectors.tobytes())
+                for i, record_id in enumerate(page['ids']):
+                    payloads.write({
+                        'id': record_id,
+                        'document': page['documents'][i],
+                        'metadata': page['metadatas'][i] or {}
+                    })
+                count += len(page['ids'])
+                offset += len(page['ids'])
+        
+        # PCA ajustée sur le corpus complet, vecteurs stockés projetés
+        if dims and count:
+            full = np.memmap(full_path, dtype=np.float32, mode='r', shape=(count, dim))
+            mean, components, explained = fit_pca(full, dims)
+            with open(vectors_path, 'wb') as vectors_file:
+                for start in range(0, count, _SCAN_BLOCK):
+                    vectors_file.write(
+                        project(full[start:start + _SCAN_BLOCK], mean, components).tobytes())
+            del full
+            with open(os.path.join(tmp_path, _PROJECTION_FILE), 'wb') as f:
+                f.write(mean.tobytes())
+                f.write(components.tobytes())
+            reduction = {'method': 'pca', 'source_dim': dim, 'explained_variance': explained}
+            dim = dims
+        if dims:
+            os.remove(full_path)
+        
+        # Codes binaires et copie quantifiée dérivés des vecteurs stockés
+        if count:
+            stored = np.memmap(vectors_path, dtype=np.float32, mode='r', shape=(count, dim))
+            with open(os.path.join(tmp_path, _BINARY_FILE), 'wb') as binary_file:
+                for start in range(0, count, _SCAN_BLOCK):
+                    binary_file.write(binary_codes(stored[start:start + _SCAN_BLOCK]).tobytes())
+            if precision in _CODES_FILES:
+                scales_parts = []
+                with open(os.path.join(tmp_path, _CODES_FILES[precision]), 'wb') as codes_file:
+                    for start in range(0, count, _SCAN_BLOCK):
+                        codes, scales = quantize(np.asarray(stored[start:start + _SCAN_BLOCK]),
+                                                 precision)
+                        codes_file.write(codes.tobytes())
+                        if scales is not None:
+                            scales_parts.append(scales)
+                if precision == 'int8':
+                    np.concatenate(scales_parts).tofile(os.path.join(tmp_path, 'scales.f32'))
+            del stored
+        
+        with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'model': model_name, 'dim': dim, 'count': count,
+                       'precision': precision, 'reduction': reduction, 'stamp': stamp}, f)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    
+    _publish(tmp_path, path)
+    return count
+
+
+def build_partition_index(path: str, field: str) -> dict:
+    """
+    Regroupe les chunks d'un index dense par valeur d'un champ de metadata
+    ('source' ou 'category')
+    
+    Chaque groupe est résumé par le centroïde normalisé de ses chunks ;
+    les chunks sont recopiés groupe par groupe (même format que l'IVF,
+    préfixe 'doc' ou 'cat') pour que le second étage lise des tranches
+    contiguës.
+    
+    Returns:
+        Métadonnées de l'index, dont 'values' (valeur de chaque partition)
+        et 'value_categories' (catégorie du premier chunk de chaque partition)
+    """
+    with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    count, dim = meta['count'], meta['dim']
+    if not count:
+        raise ValueError(f"Dense index {path} is empty")
+    vectors = np.memmap(os.path.join(path, 'vectors.f32'), dtype=np.float32,
+                        mode='r', shape=(count, dim))
+    
+    row_values = []
+    value_categories = {}
+    payloads = ChunkStore(os.path.join(path, 'payloads.jsonl'))
+    for payload in payloads:
+        metadata = payload['metadata'] or {}
+        value = str(metadata.get(field, 'Unknown'))
+        row_values.append(value)
+        value_categories.setdefault(value, metadata.get('category', 'General'))
+    payloads.close()
+    values = sorted(set(row_values))
+    value_ids = {value: i for i, value in enumerate(values)}
+    labels = np.array([value_ids[value] for value in row_values], dtype=np.int64)
+    
+    # Somme des vecteurs de chaque partition, par blocs
+    sums = np.zeros((len(values), dim), dtype=np.float32)
+    for start in range(0, count, _SCAN_BLOCK):
+        block_labels = labels[start:start + _SCAN_BLOCK]
+        order = np.argsort(block_labels, kind='stable')
+        present, starts = np.unique(block_labels[order], return_index=True)
+        block = np.asarray(vectors[start:start + _SCAN_BLOCK])[order]
+        sums[present] += np.add.reduceat(block, starts, axis=0)
+    
+    return write_partitions(path, PARTITION_PREFIXES[field], vectors, labels, normalize(sums),
+                            field=field, values=values,
+                            value_categories=[value_categories[value] for value in values])
+
+
+class NumpyDenseIndex:
+    """
+    Recherche dense exacte en mémoire
+    
+    Les embeddings normalisés forment une seule matrice contiguë mappée
+    depuis le disque : le top-k d'une requête est un produit matrice-vecteur
+    suivi d'un argpartition, sans passer par le client Chroma.
+    
+    En float16 / int8, seule la copie quantifiée (2x / 4x plus petite) est
+    parcourue ; les rescore_factor * top_k meilleurs candidats sont ensuite
+    rescorés avec les vecteurs float32, dont seules ces lignes sont lues.
+    
+    Avec prefilter='binary', le premier étage classe tous les chunks par
+    distance de Hamming sur leurs codes binaires (48 octets par vecteur
+    pour 384 dimensions) et seuls les prefilter_candidates premiers sont
+    rescorés en cosinus exact.
+    
+    Avec nprobe, si l'index IVF a été construit (ivf_index.py), seules les
+    nprobe partitions k-means les plus proches de la requête sont parcourues.
+    
+    top_documents / sources permettent une recherche en deux niveaux :
+    d'abord les documents dont le centroïde est le plus proche, puis
+    uniquement les chunks de ces documents. categories limite la recherche
+    aux partitions des catégories données.
+    
+    Si l'index a été exporté avec dims (PCA), les vecteurs stockés sont
+    réduits et chaque requête est projetée avant la recherche (project).
+    """
+    
+    backend = 'numpy'
+    
+    def __init__(self, path: str, rescore_factor: int = DEFAULT_RESCORE_FACTOR,
+                 prefilter: Optional[str] = None,
+                 prefilter_candidates: int = DEFAULT_PREFILTER_CANDIDATES,
+                 nprobe: Optional[int] = None):
+        if prefilter not in DENSE_PREFILTERS:
+            raise ValueError(f"Unknown prefilter '{prefilter}', expected one of {DENSE_PREFILTERS}")
+        self.path = path
+        self.rescore_factor = rescore_factor
+        self.prefilter = prefilter
+        self.prefilter_candidates = prefilter_candidates
+        self.nprobe = nprobe
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.precision = self.meta.get('precision', 'float32')
+        self.payloads = ChunkStore(os.path.join(path, 'payloads.jsonl'))
+        
+        count = self.meta['count']
+        self.codes = None
+        self.scales = None
+        self.binary = None
+        self.ivf = None
+        self._partitions = {}
+        self.mean = None
+        self.components = None
+        reduction = self.meta.get('reduction')
+        if reduction:
+            projection = np.fromfile(os.path.join(path, _PROJECTION_FILE), dtype=np.float32)
+            source_dim = reduction['source_dim']
+            self.mean = projection[:source_dim]
+            self.components = projection[source_dim:].reshape(self.meta['dim'], source_dim)
+        if count:
+            shape = (count, self.meta['dim'])
+            self.vectors = np.memmap(os.path.join(path, 'vectors.f32'), dtype=np.float32,
+                                     mode='r', shape=shape)
+            if self.precision in _CODES_FILES:
+                self.codes = np.memmap(os.path.join(path, _CODES_FILES[self.precision]),
+                                       dtype=self.precision, mode='r', shape=shape)
+            if self.precision == 'int8':
+                self.scales = np.memmap(os.path.join(path, 'scales.f32'), dtype=np.float32,
+                                        mode='r', shape=(count,))
+            if prefilter == 'binary':
+                self.binary = self._load_binary_codes()
+            if nprobe:
+                if IVFIndex.available(path, count):
+                    self.ivf = IVFIndex(path)
+                else:
+                    print(f"   ⚠️  No up-to-date IVF index in {path}, "
+                          f"run 'python ivf_index.py' (using flat search)")
+        else:
+            self.vectors = np.zeros((0, 0), dtype=np.float32)
+    
+    def __len__(self) -> int:
+        return self.meta['count']
+    
+    @property
+    def dims(self) -> Optional[int]:
+        """Dimension réduite des vecteurs stockés (None : pas de réduction)"""
+        return self.meta['dim'] if self.meta.get('reduction') else None
+    
+    def project(self, query_embedding) -> np.ndarray:
+        """Requête(s) normalisée(s) dans l'espace des vecteurs stockés"""
+        if self.components is None:
+            return normalize(query_embedding)
+        return project(query_embedding, self.mean, self.components)
+    
+    def _load_binary_codes(self) -> np.ndarray:
+        binary_path = os.path.join(self.path, _BINARY_FILE)
+        words = -(-self.meta['dim'] // 64)
+        if os.path.exists(binary_path):
+            return np.memmap(binary_path, dtype='<u8', mode='r', shape=(len(self), words))
+        # Index exporté avant le préfiltre : codes calculés en mémoire
+        return np.concatenate([
+            binary_codes(self.vectors[start:start + _SCAN_BLOCK])
+            for start in range(0, len(self), _SCAN_BLOCK)
+        ])
+    
+    def partition_index(self, field: str):
+        """
+        Index partitionné par valeur de metadata, construit au premier usage
+        
+        Returns:
+            (IVFIndex, {valeur: numéro de partition})
+        """
+        if field not in self._partitions:
+            prefix = PARTITION_PREFIXES[field]
+            partitions = None
+            if IVFIndex.available(self.path, len(self), prefix):
+                partitions = IVFIndex(self.path, prefix)
+            if partitions is None or 'values' not in partitions.meta:
+                stats = build_partition_index(self.path, field)
+                print(f"   ✅ Partition index built: {stats['n_lists']} partitions by {field}")
+                partitions = IVFIndex(self.path, prefix)
+            value_ids = {value: i for i, value in enumerate(partitions.meta['values'])}
+            self._partitions[field] = (partitions, value_ids)
+        return self._partitions[field]
+    
+    def top_documents(self, query_embedding, n: int = 5,
+                      categories: Optional[List[str]] = None) -> List[str]:
+        """Sources des n documents (des catégories données) au vecteur résumé le plus proche"""
+        if not len(self):
+            return []
+        documents, _ = self.partition_index('source')
+        query = self.project(query_embedding)[0]
+        if categories is None:
+            lists = documents.nearest_lists(query, n)
+        else:
+            allowed = np.array([
+                i for i, category in enumerate(documents.meta['value_categories'])
+                if category in categories
+            ], dtype=np.int64)
+            scores = documents.centroids[allowed] @ query if len(allowed) else np.zeros(0)
+            lists = allowed[np.argsort(-scores, kind='stable')[:n]]
+        return [documents.meta['values'][l] for l in lists]
+    
+    def category_centroids(self):
+        """
+        Catégories et vecteur résumé (centroïde normalisé) de chacune,
+        dans l'espace des vecteurs stockés (voir project)
+        
+        Returns:
+            (liste des catégories, matrice (n_categories, dim))
+        """
+        if not len(self):
+            return [], np.zeros((0, 0), dtype=np.float32)
+        categories, _ = self.partition_index('category')
+        return list(categories.meta['values']), np.asarray(categories.centroids)
+    
+    def _shortlist(self, query: np.ndarray, size: int) -> np.ndarray:
+        """Lignes candidates du premier étage (Hamming ou vecteurs quantifiés)"""
+        if self.binary is not None:
+            distances = hamming_distances(self.binary, binary_codes(query[None, :])[0])
+            return np.argpartition(distances, size - 1)[:size]
+        return np.argpartition(-self._approximate_scores(query), size - 1)[:size]
+    
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """Scores approchés sur la copie quantifiée, par blocs de lignes"""
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), _SCAN_BLOCK):
+            end = start + _SCAN_BLOCK
+            scores[start:end] = self.codes[start:end].astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+    
+    def top_k(self, query_embedding, top_k: int = 5, sources: Optional[List[str]] = None,
+              categories: Optional[List[str]] = None):
+        """
+        Lignes et similarités cosinus des top_k vecteurs les plus proches
+        (parmi les chunks des documents sources et/ou des catégories données)
+        
+        Returns:
+            (rows, scores) triés par score décroissant
+        """
+        n = len(self)
+        k = min(top_k, n)
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        
+        query = self.project(query_embedding)[0]
+        if sources is not None:
+            documents, source_ids = self.partition_index('source')
+            lists = [source_ids[s] for s in sources if s in source_ids]
+            if categories is not None:
+                lists = [l for l in lists if documents.meta['value_categories'][l] in categories]
+            return documents.top_k(query, k, lists=lists)
+        if categories is not None:
+            partitions, category_ids = self.partition_index('category')
+            lists = [category_ids[c] for c in categories if c in category_ids]
+            return partitions.top_k(query, k, lists=lists)
+        
+        if self.ivf is not None:
+            return self.ivf.top_k(query, k, self.nprobe)
+        
+        if self.binary is None and self.codes is None:
+            scores = self.vectors @ query
+            if k < n:
+                rows = np.argpartition(-scores, k - 1)[:k]
+            else:
+                rows = np.arange(n)
+            scores = scores[rows]
+        else:
+            # Présélection (Hamming ou vecteurs quantifiés), puis rescoring exact
+            if self.binary is not None:
+                shortlist = min(max(self.prefilter_candidates, k), n)
+            else:
+                shortlist = min(k * self.rescore_factor, n)
+            if shortlist < n:
+                rows = self._shortlist(query, shortlist)
+            else:
+                rows = np.arange(n)
+            rows = np.sort(rows)  # lecture séquentielle du memmap float32
+            scores = self.vectors[rows] @ query
+        
+        order = np.argsort(-scores, kind='stable')[:k]
+        return rows[order], scores[order]
+    
+    def search(self, query_embedding, top_k: int = 5,
+               sources: Optional[List[str]] = None,
+               categories: Optional[List[str]] = None) -> List[Dict]:
+        """Top-k au format commun : [{'id', 'document', 'metadata', 'similarity'}]"""
+        rows, scores = self.top_k(query_embedding, top_k, sources, categories)
+        return self.hits(rows, scores)
+    
+    def hits(self, rows, scores) -> List[Dict]:
+        """Lignes et scores au format commun (payloads lus dans payloads.jsonl)"""
+        hits = []
+        for row, score in zip(rows, scores):
+            payload = self.payloads[int(row)]
+            payload['similarity'] = float(score)
+            hits.append(payload)
+        return hits
+    
+    def close(self):
+        """Libère les fichiers mappés"""
+        self.payloads.close()
+        self.vectors = None
+        self.codes = None
+        self.scales = None
+        self.binary = None
+        self.ivf = None
+        self._partitions = {}
+        self.mean = None
+        self.components = None
+
+
+class ChromaDenseIndex:
+    """Même interface que NumpyDenseIndex, servie par collection.query"""
+    
+    backend = 'chroma'
+    
+    def __init__(self, collection):
+        self.collection = collection
+    
+    def __len__(self) -> int:
+        return self.collection.count()
+    
+    def search(self, query_embedding, top_k: int = 5,
+               sources: Optional[List[str]] = None,
+               categories: Optional[List[str]] = None) -> List[Dict]:
+        """Top-k au format commun : [{'id', 'document', 'metadata', 'similarity'}]"""
+        query_embedding = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        if (sources is not None and not sources) or (categories is not None and not categories):
+            return []
+        
+        # Pré-filtrage par metadata, évalué par Chroma
+        clauses = []
+        if sources is not None:
+            clauses.append({'source': {'$in': list(sources)}})
+        if categories is not None:
+            clauses.append({'category': {'$in': list(categories)}})
+        where = None
+        if len(clauses) == 1:
+            where = clauses[0]
+        elif clauses:
+            where = {'$and': clauses}
+        
+        results = self.collection.query(
+            query_embeddings=[query_embedding.tolist()],
+            n_results=top_k,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+        
+        # Distance L2² ou cosinus selon l'espace de la collection
+        space = (self.collection.metadata or {}).get('hnsw:space', 'l2')
+        hits = []
+        for i, record_id in enumerate(results['ids'][0]):
+            distance = results['distances'][0][i]
+            hits.append({
+                'id': record_id,
+                'document': results['documents'][0][i],
+                'metadata': results['metadatas'][0][i] or {},
+                'similarity': 1 - distance if space == 'cosine' else 1 - distance / 2
+            })
+        return hits
+    
+    def close(self):
+        pass
+
+
+def open_dense_index(backend: str, collection, path: str,
+                     model_name: Optional[str] = None, rebuild: bool = False,
+                     precision: Optional[str] = None, dims: Optional[int] = None,
+                     **options):
+    """
+    Ouvre le backend dense demandé pour une collection Chroma
+    
+    Avec 'numpy', l'index est (re)construit depuis la collection s'il
+    n'existe pas, s'il est demandé, si la collection a été modifiée
+    depuis l'export (tampon de mise à jour ou nombre de vecteurs
+    différent), ou si une autre précision ou dimension réduite (dims,
+    0 : aucune réduction) est demandée (None garde celles de l'index
+    existant). Les options
+    (prefilter, prefilter_candidates, rescore_factor, nprobe) sont passées à
+    NumpyDenseIndex et ignorées par le backend Chroma.
+    """
+    if backend not in DENSE_BACKENDS:
+        raise ValueError(f"Unknown dense backend '{backend}', expected one of {DENSE_BACKENDS}")
+    if backend == 'chroma':
+        return ChromaDenseIndex(collection)
+    
+    meta_path = os.path.join(path, 'meta.json')
+    if not rebuild and os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        current_dims = meta['dim'] if meta.get('reduction') else 0
+        rebuild = meta.get('stamp') != collection_stamp(collection) or \
+            meta['count'] != collection.count() or (
+            precision is not None and meta.get('precision', 'float32') != precision) or (
+            dims is not None and dims != current_dims)
+        if precision is None:
+            precision = meta.get('precision', DEFAULT_DENSE_PRECISION)
+        if dims is None:
+            dims = current_dims
+    else:
+        rebuild = True
+    
+    if rebuild:
+        count = export_collection(collection, path, model_name,
+                                  precision=precision or DEFAULT_DENSE_PRECISION,
+                                  dims=dims or None)
+        print(f"   ✅ Dense index exported: {count} vectors -> {path}")
+    return NumpyDenseIndex(path, **options)
@@ -0,0 +1,115 @@
+from typing import Callable, List, Optional
+import numpy as np
+from embedding_cache import EmbeddingCache, text_hash
+
+# Budget par défaut : ~64 chunks de 128 tokens, ou 16 chunks pleins (256 tokens)
+DEFAULT_TOKEN_BUDGET = 8192
+DEFAULT_MAX_BATCH_SIZE = 256
+DEFAULT_BUCKET_WIDTH = 16
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation rapide du nombre de tokens WordPiece (~4/3 token par mot + [CLS]/[SEP])"""
+    return len(text.split()) * 4 // 3 + 2
+
+
+class EmbeddingBatcher:
+    """
+    Encode des textes par lots dimensionnés en tokens plutôt qu'en nombre
+    
+    Les textes sont triés par longueur et regroupés par buckets pour que
+    chaque lot contienne des textes de taille voisine (peu de padding),
+    avec au plus token_budget tokens paddés par lot. Les vecteurs sont
+    rendus dans l'ordre d'origine des textes.
+    
+    Avec un EmbeddingCache, seuls les textes absents du cache passent
+    par le modèle ; les nouveaux vecteurs y sont ajoutés.
+    """
+    
+    def __init__(self, model,
+                 token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 bucket_width: int = DEFAULT_BUCKET_WIDTH,
+                 length_fn: Callable[[str], int] = estimate_tokens,
+                 cache: Optional[EmbeddingCache] = None):
+        self.model = model
+        self.cache = cache
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
+        self.bucket_width = bucket_width
+        self.length_fn = length_fn
+        # Au-delà de max_seq_length le modèle tronque : inutile de compter plus
+        self.max_seq_length = getattr(model, 'max_seq_length', None) or 512
+    
+    def _bucketed_length(self, text: str) -> int:
+        length = min(self.length_fn(text), self.max_seq_length)
+        # Arrondi au bucket supérieur
+        return -(-length // self.bucket_width) * self.bucket_width
+    
+    def plan(self, texts: List[str]) -> List[List[int]]:
+        """Découpe les positions des textes en lots de longueur homogène"""
+        lengths = [self._bucketed_length(text) for text in texts]
+        order = sorted(range(len(texts)), key=lambda i: lengths[i])
+        
+        batches = []
+        batch = []
+        for i in order:
+            # Le lot est paddé à la longueur de son plus long texte (le dernier ajouté)
+            if batch and ((len(batch) + 1) * lengths[i] > self.token_budget
+                          or len(batch) >= self.max_batch_size):
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode les textes et retourne une matrice float32 (len(texts), dim)
+        dans l'ordre d'origine
+        """
+        texts = list(texts)
+        if not texts:
+            dim = self.model.get_sentence_embedding_dimension()
+            return np.zeros((0, dim), dtype=np.float32)
+        
+        if self.cache is None:
+            return self._encode_model(texts)
+        
+        hashes = [text_hash(text) for text in texts]
+        cached = self.cache.get(hashes)
+        
+        # Un seul passage modèle par texte distinct absent du cache
+        missing = {}
+        for i, vector in enumerate(cached):
+            if vector is None:
+                missing.setdefault(hashes[i], i)
+        
+        if missing:
+            positions = list(missing.values())
+            computed = self._encode_model([texts[i] for i in positions])
+            self.cache.put(list(missing.keys()), computed)
+            by_hash = dict(zip(missing.keys(), computed))
+        else:
+            by_hash = {}
+        
+        dim = computed.shape[1] if missing else len(cached[0])
+        out = np.empty((len(texts), dim), dtype=np.float32)
+        for i, vector in enumerate(cached):
+            out[i] = vector if vector is not None else by_hash[hashes[i]]
+        return out
+    
+    def _encode_model(self, texts: List[str]) -> np.ndarray:
+        out = None
+        for batch in self.plan(texts):
+            embeddings = self.model.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+            if out is None:
+                out = np.empty((len(texts), embeddings.shape[1]), dtype=np.float32)
+            out[batch] = embeddings
+        return out
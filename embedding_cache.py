@@ -0,0 +1,195 @@
+import os
+import re
+import json
+import hashlib
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CACHE_DIR = './embedding_cache'
+
+
+def text_hash(text: str) -> str:
+    """Hash du contenu d'un texte (clé du cache)"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+class EmbeddingCache:
+    """
+    Cache disque des embeddings, par modèle et hash du texte
+    
+    Un dossier par modèle contient :
+      - vectors.f32 : matrice float32 (n, dim) brute, lue en memmap
+      - index.txt   : un hash par ligne, la ligne i décrit la ligne i de la matrice
+      - meta.json   : nom du modèle et dimension
+    
+    Les ajouts se font en fin de fichier (vecteurs d'abord, index ensuite),
+    un crash ne laisse donc jamais l'index pointer vers un vecteur absent.
+    Plusieurs processus peuvent partager un cache : chaque ajout se fait
+    sous un verrou exclusif (fichier 'lock'), après relecture des lignes
+    ajoutées par les autres, et la ligne des nouveaux vecteurs est déduite
+    de la taille de vectors.f32 sur disque.
+    """
+    
+    def __init__(self, model_name: str, cache_dir: str = CACHE_DIR):
+        self.model_name = model_name
+        # 'all-MiniLM-L6-v2' et 'sentence-transformers/all-MiniLM-L6-v2' sont le même modèle
+        if model_name.startswith('sentence-transformers/'):
+            model_name = model_name[len('sentence-transformers/'):]
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self.path = os.path.join(cache_dir, slug)
+        self.vectors_path = os.path.join(self.path, 'vectors.f32')
+        self.index_path = os.path.join(self.path, 'index.txt')
+        self.meta_path = os.path.join(self.path, 'meta.json')
+        self.lock_path = os.path.join(self.path, 'lock')
+        
+        self.dim = None
+        self.rows: Dict[str, int] = {}
+        # Lignes de index.txt déjà lues (= lignes de vectors.f32) et leur taille en octets
+        self._n_lines = 0
+        self._index_offset = 0
+        self._matrix = None
+        self.hits = 0
+        self.misses = 0
+        
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                self.dim = json.load(f)['dim']
+            # Sous verrou : ne pas tronquer un ajout en cours d'un autre processus
+            with self._locked():
+                self._load_index()
+    
+    @contextmanager
+    def _locked(self):
+        """Verrou exclusif inter-processus sur le cache"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.lock_path, 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    
+    def _read_hashes(self, offset: int = 0) -> List[bytes]:
+        """Lignes complètes de index.txt à partir de offset (octets)"""
+        if not os.path.exists(self.index_path):
+            return []
+        with open(self.index_path, 'rb') as f:
+            f.seek(offset)
+            return f.read().split(b'\n')[:-1]
+    
+    def _n_vectors(self) -> int:
+        if not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (4 * self.dim)
+    
+    def _add_lines(self, hashes: List[bytes]):
+        for line in hashes:
+            # Un texte mis en cache par deux processus : la première ligne fait foi
+            self.rows.setdefault(line.decode('ascii'), self._n_lines)
+            self._n_lines += 1
+            self._index_offset += len(line) + 1
+    
+    def _load_index(self):
+        hashes = self._read_hashes()
+        n_vectors = self._n_vectors()
+        
+        n = min(len(hashes), n_vectors)
+        self.rows = {}
+        self._n_lines = 0
+        self._index_offset = 0
+        self._add_lines(hashes[:n])
+        
+        # Réaligner les deux fichiers après une écriture interrompue
+        if n_vectors != n or len(hashes) != n:
+            with open(self.vectors_path, 'ab') as f:
+                f.truncate(n * 4 * self.dim)
+            with open(self.index_path, 'wb') as f:
+                f.write(b''.join(h + b'\n' for h in hashes[:n]))
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def _vectors(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r',
+                                     shape=(self._n_lines, self.dim))
+        return self._matrix
+    
+    def get(self, hashes: List[str]) -> List[Optional[np.ndarray]]:
+        """Retourne le vecteur de chaque hash, ou None s'il n'est pas en cache"""
+        found = [self.rows.get(h) for h in hashes]
+        hit_rows = [row for row in found if row is not None]
+        self.hits += len(hit_rows)
+        self.misses += len(found) - len(hit_rows)
+        if not hit_rows:
+            return [None] * len(hashes)
+        
+        matrix = self._vectors()
+        return [None if row is None else np.array(matrix[row]) for row in found]
+    
+    def put(self, hashes: List[str], vectors: np.ndarray):
+        """Ajoute des vecteurs au cache (les hashes déjà présents sont ignorés)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        new = {}
+        for h, vector in zip(hashes, vectors):
+            if h not in self.rows and h not in new:
+                new[h] = vector
+        if not new:
+            return
+        
+        with self._locked():
+            if self.dim is None:
+                if os.path.exists(self.meta_path):
+                    # Cache créé par un autre processus depuis l'ouverture
+                    with open(self.meta_path, 'r', encoding='utf-8') as f:
+                        self.dim = json.load(f)['dim']
+                else:
+                    self.dim = int(vectors.shape[1])
+                    with open(self.meta_path, 'w', encoding='utf-8') as f:
+                        json.dump({'model': self.model_name, 'dim': self.dim}, f)
+            
+            # Lignes ajoutées par les autres processus depuis la dernière lecture
+            self._add_lines(self._read_hashes(self._index_offset))
+            if self._n_vectors() != self._n_lines:
+                self._load_index()
+            new = {h: vector for h, vector in new.items() if h not in self.rows}
+            if not new:
+                self._matrix = None
+                return
+            
+            start = self._n_vectors()
+            with open(self.vectors_path, 'ab') as f:
+                f.write(np.stack(list(new.values())).astype(np.float32).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.index_path, 'ab') as f:
+                f.write(b''.join(h.encode('ascii') + b'\n' for h in new))
+            
+            for row, h in enumerate(new, start):
+                self.rows[h] = row
+            self._n_lines = start + len(new)
+            self._index_offset += sum(len(h) + 1 for h in new)
+        # La matrice a grandi : rouvrir le memmap au prochain accès
+        self._matrix = None
+    
+    def summary(self) -> str:
+        """Résumé des hits/misses depuis l'ouverture"""
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return (f"Embedding cache: {self.hits} hits, {self.misses} misses "
+                f"({rate:.0f}% reused, {len(self.rows)} vectors stored)")
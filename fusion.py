@@ -0,0 +1,48 @@
+from typing import List, Sequence, Tuple
+import numpy as np
+
+# Fusion des listes de résultats de la recherche hybride, sur des tableaux
+# indexés par ligne du chunk store (un chunk = une entrée, même si plusieurs
+# chunks partagent source et titre)
+FUSION_METHODS = ('weighted', 'rrf')
+DEFAULT_FUSION = 'weighted'
+# Constante de la Reciprocal Rank Fusion : 1 / (k + rang)
+DEFAULT_RRF_K = 60
+
+
+def fuse(branches: List[Tuple[np.ndarray, np.ndarray]], weights: Sequence[float],
+         method: str = DEFAULT_FUSION, rrf_k: int = DEFAULT_RRF_K):
+    """
+    Fusionne les (rows, scores) de chaque branche, scores triés décroissants
+    
+    'weighted' : somme des scores pondérés par branche ; 'rrf' : somme des
+    weight / (rrf_k + rang). Les contributions sont sommées en un passage
+    (np.unique + np.bincount) sur la concaténation des candidats.
+    
+    Returns:
+        (rows, scores, masks) par score fusionné décroissant ; le bit i de
+        masks indique que la ligne vient de la branche i
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method {method!r}, expected one of {FUSION_METHODS}")
+    lengths = [len(rows) for rows, _ in branches]
+    if not sum(lengths):
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0, dtype=np.int64)
+    
+    rows = np.concatenate([np.asarray(rows, dtype=np.int64) for rows, _ in branches])
+    branch = np.repeat(np.arange(len(branches)), lengths)
+    branch_weights = np.asarray(weights, dtype=np.float64)[branch]
+    if method == 'weighted':
+        scores = np.concatenate([np.asarray(scores, dtype=np.float64) for _, scores in branches])
+        contributions = branch_weights * scores
+    else:
+        ranks = np.concatenate([np.arange(1, n + 1) for n in lengths])
+        contributions = branch_weights / (rrf_k + ranks)
+    
+    unique, inverse = np.unique(rows, return_inverse=True)
+    fused = np.bincount(inverse, weights=contributions, minlength=len(unique))
+    masks = np.zeros(len(unique), dtype=np.int64)
+    np.bitwise_or.at(masks, inverse, 1 << branch)
+    
+    order = np.argsort(-fused, kind='stable')
+    return unique[order], fused[order], masks[order]
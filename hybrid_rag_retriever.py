@@ -2,13 +2,21 @@ import os
 import json
 import math
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 from sentence_transformers import SentenceTransformer, CrossEncoder
 import chromadb
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 import ollama
+from chunk_store import ChunkStore, CHUNKS_FILE
+from category_router import CategoryRouter
+from dense_index import (open_dense_index, dense_index_path, NumpyDenseIndex,
+                         DEFAULT_DENSE_BACKEND, DEFAULT_PREFILTER_CANDIDATES)
+from sharded_search import ShardedRetriever
+from snapshot import snapshot_paths
+from bm25_index import BM25Index, open_bm25
+from trigram_index import TrigramIndex, open_trigrams, code_terms
+from fusion import fuse, DEFAULT_FUSION, DEFAULT_RRF_K
 
 # ==============================================================================
 # CHEMINS LOCAUX (modifie si ton username n'est pas 'omara')
@@ -23,43 +31,79 @@ os.environ['HUGGINGFACE_HUB_OFFLINE'] = '1'
 # CLASSE HYBRIDWIKIRAG
 # ==============================================================================
 
+# Branches d'origine d'un chunk fusionné (bits : dense, sparse, exact)
+_FUSED_METHODS = {1: 'dense', 2: 'sparse_only', 4: 'exact_only'}
+
+
+def _top_within(rows: np.ndarray, scores: np.ndarray, top_k: int, allowed: np.ndarray = None):
+    """Top-k de (rows, scores) restreint aux lignes allowed (None : toutes), à égalité par rang d'entrée"""
+    if allowed is not None:
+        keep = np.isin(rows, allowed)
+        rows, scores = rows[keep], scores[keep]
+    order = np.argsort(-scores, kind='stable')[:top_k]
+    return rows[order], scores[order]
+
+
 class HybridWikiRAG:
     """RAG avec recherche hybride (dense + sparse) + reranking"""
     
-    def __init__(self, model_name='sentence-transformers/all-MiniLM-L6-v2'):
+    def __init__(self, model_name='sentence-transformers/all-MiniLM-L6-v2',
+                 dense_backend: str = DEFAULT_DENSE_BACKEND,
+                 dense_precision: str = None,
+                 dense_dims: int = None,
+                 dense_prefilter: str = None,
+                 prefilter_candidates: int = DEFAULT_PREFILTER_CANDIDATES,
+                 nprobe: int = None,
+                 route_categories: bool = True,
+                 shards: int = 0,
+                 snapshot: str = None):
         print("Initializing Hybrid WikiRAG with Reranking...")
         
-        # Vector store (dense search)
-        self.client = chromadb.PersistentClient(path="./chroma_data")
+        # snapshot : dossier installé par 'python snapshot.py import', ouvert en
+        # memmap sans Chroma ni index à reconstruire (précision / dims du snapshot)
+        paths = snapshot_paths(snapshot) if snapshot else None
+        if paths:
+            print(f"Opening snapshot {snapshot}...")
+            self.client = None
+            self.collection = None
+            self.dense_index = NumpyDenseIndex(paths['dense'], prefilter=dense_prefilter,
+                                               prefilter_candidates=prefilter_candidates,
+                                               nprobe=nprobe)
+        else:
+            self._open_collection(model_name, dense_backend, dense_precision, dense_dims,
+                                  dense_prefilter, prefilter_candidates, nprobe)
         
-        try:
-            self.collection = self.client.get_collection("wiki")
-            print(f"✅ Loaded existing collection with {self.collection.count()} documents")
-        except Exception as e:
-            print(f"❌ Error loading collection: {e}")
-            print("Run 'python create_vector_store.py' first!")
-            raise
+        # Routeur requête -> catégorie (centroïdes des partitions par catégorie)
+        self.router = CategoryRouter.from_dense_index(self.dense_index) if route_categories else None
         
         # Charger embedding model
         print("Loading embedding model from local path...")
         self.embedding_model = SentenceTransformer(LOCAL_EMBEDDING_PATH)
         
-        # Charger documents pour sparse search
-        print("Loading documents for sparse search...")
-        with open('processed_wiki/chunks.json', 'r', encoding='utf-8') as f:
-            self.chunks = json.load(f)
-        
-        self.corpus = [c['content'] for c in self.chunks]
-        
-        # TF-IDF vectorizer
-        print("Building TF-IDF index...")
-        self.tfidf = TfidfVectorizer(
-            max_features=1000,
-            stop_words='english',
-            lowercase=True,
-            ngram_range=(1, 2)
-        )
-        self.tfidf_matrix = self.tfidf.fit_transform(self.corpus)
+        # Chunks lus à la demande (JSONL + index d'offsets)
+        print("Opening chunk store for sparse search...")
+        self.chunks = ChunkStore(paths['chunks'] if paths else CHUNKS_FILE)
+        
+        # Index BM25 persistant (postings en memmap), mis à jour s'il est périmé
+        print("Opening BM25 index...")
+        self.bm25 = BM25Index(paths['sparse']) if paths else open_bm25(CHUNKS_FILE)
+        # Index de trigrammes : identifiants, clés, ports, phrases exactes de la requête
+        print("Opening trigram index...")
+        self.trigrams = (TrigramIndex(paths['trigrams'], paths['chunks']) if paths
+                         else open_trigrams(CHUNKS_FILE))
+        # Lignes du chunk store par source / catégorie (recherche filtrée, construit au besoin)
+        self._field_rows = {}
+        
+        # shards > 1 : recherches non filtrées réparties sur autant de processus
+        self.sharded = None
+        if shards > 1:
+            print(f"Starting {shards} retrieval shards...")
+            dense_index = self.dense_index if hasattr(self.dense_index, 'project') else None
+            self.sharded = ShardedRetriever(dense_index, self.bm25, shards)
+        
+        # Branches sparse et exacte de hybrid_search, exécutées pendant la branche
+        # dense (encodage, produit matriciel / Chroma : code natif qui libère le GIL)
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='retrieval')
         
         # Reranker model
         print("Loading reranker model from local path...")
@@ -67,54 +111,212 @@ class HybridWikiRAG:
         
         print("✅ Hybrid WikiRAG with Reranking initialized\n")
     
-    def dense_search(self, query: str, top_k: int = 5) -> List[Dict]:
-        """Recherche dense (embeddings)"""
-        query_embedding = self.embedding_model.encode(query)
-        
-        results = self.collection.query(
-            query_embeddings=[query_embedding.tolist()],
-            n_results=top_k,
-            include=["documents", "metadatas", "distances"]
-        )
+    def _open_collection(self, model_name, dense_backend, dense_precision, dense_dims,
+                         dense_prefilter, prefilter_candidates, nprobe):
+        """Collection Chroma 'wiki' et son backend dense"""
+        # Vector store (dense search)
+        self.client = chromadb.PersistentClient(path="./chroma_data")
         
-        dense_results = []
-        for i in range(len(results['documents'][0])):
-            doc = results['documents'][0][i]
-            metadata = results['metadatas'][0][i]
-            distance = results['distances'][0][i]
-            similarity = 1 - (distance / 2)
-            
-            dense_results.append({
-                'content': doc,
-                'source': metadata['source'],
-                'title': metadata['title'],
-                'category': metadata.get('category', 'General'),
-                'relevance': similarity,
-                'method': 'dense'
+        try:
+            self.collection = self.client.get_collection("wiki")
+            print(f"✅ Loaded existing collection with {self.collection.count()} documents")
+        except Exception as e:
+            print(f"❌ Error loading collection: {e}")
+            print("Run 'python create_vector_store.py' first!")
+            raise
+        
+        # Backend dense : matrice NumPy en memmap (défaut) ou requêtes Chroma.
+        # dense_precision (float16/int8) réduit la mémoire parcourue, None garde l'index existant.
+        # dense_dims : vecteurs stockés réduits par PCA (0 : dimension complète, None : inchangé).
+        # dense_prefilter='binary' : classement Hamming puis cosinus exact sur prefilter_candidates.
+        # nprobe : ne parcourir que les nprobe partitions IVF les plus proches (ivf_index.py)
+        print(f"Opening dense index ({dense_backend})...")
+        self.dense_index = open_dense_index(
+            dense_backend,
+            self.collection,
+            dense_index_path("wiki", "./chroma_data"),
+            model_name=model_name,
+            precision=dense_precision,
+            dims=dense_dims,
+            prefilter=dense_prefilter,
+            prefilter_candidates=prefilter_candidates,
+            nprobe=nprobe
+        )
+    
+    def _results(self, rows, scores, methods, limit: int = None) -> List[Dict]:
+        """
+        Résultats au format commun, lus dans le chunk store (au plus limit)
+        
+        methods : nom de la méthode, ou un nom par ligne
+        """
+        if isinstance(methods, str):
+            methods = [methods] * len(rows)
+        results = []
+        for row, score, method in zip(rows, scores, methods):
+            if len(results) == limit:
+                break
+            chunk = self.chunks[int(row)]
+            # Quasi-doublon d'un autre chunk : ne pas gaspiller une place
+            if chunk.get('duplicate_of'):
+                continue
+            results.append({
+                'content': chunk['content'],
+                'source': chunk['source'],
+                'title': chunk['title'],
+                'category': chunk.get('category', 'General'),
+                'relevance': float(score),
+                'method': method
             })
+        return results
+    
+    def dense_search(self, query: str, top_k: int = 5, sources: List[str] = None,
+                     query_embedding=None, categories: List[str] = None) -> List[Dict]:
+        """Recherche dense (embeddings), limitée aux documents sources / catégories si donnés"""
+        return self._results(*self._dense_rows(query, top_k, sources, query_embedding,
+                                               categories), 'dense')
+    
+    def _dense_rows(self, query: str, top_k: int = 5, sources: List[str] = None,
+                    query_embedding=None, categories: List[str] = None):
+        """
+        Top-k dense en (lignes du chunk store, similarités)
+        
+        Les IDs des hits sont retrouvés dans le fichier .keys du chunk store ;
+        ceux qui n'y sont pas (index dense à reconstruire, anciens IDs) sont
+        ignorés avec un avertissement.
+        """
+        if query_embedding is None:
+            query_embedding = self.embedding_model.encode(query)
+        
+        if (self.sharded is not None and self.sharded.dense_index is not None
+                and sources is None and categories is None):
+            hits = self.dense_index.hits(*self.sharded.dense_top_k(query_embedding, top_k))
+        else:
+            hits = self.dense_index.search(query_embedding, top_k=top_k, sources=sources,
+                                           categories=categories)
+        
+        rows = self.chunks.rows_of([hit['id'] for hit in hits])
+        scores = np.array([hit['similarity'] for hit in hits], dtype=np.float32)
+        known = rows >= 0
+        if not known.all():
+            print(f"  ⚠️  {int((~known).sum())} dense hits not in the chunk store, dropped "
+                  f"(e.g. {hits[int(np.argmin(known))]['id']!r}); rebuild with 'python wiki_embedder.py'")
+        return rows[known], scores[known]
+    
+    def close(self):
+        """Arrête les threads de recherche et les shards"""
+        self.executor.shutdown()
+        if self.sharded is not None:
+            self.sharded.close()
+    
+    def _rows_for(self, field: str, values: List[str]) -> np.ndarray:
+        """Positions (triées) dans le chunk store des chunks dont field vaut l'une des valeurs"""
+        if field not in self._field_rows:
+            by_value = {}
+            for row, chunk in enumerate(self.chunks):
+                by_value.setdefault(chunk.get(field, 'General'), []).append(row)
+            self._field_rows[field] = {
+                value: np.array(rows, dtype=np.int64) for value, rows in by_value.items()
+            }
+        rows = [self._field_rows[field][v] for v in values if v in self._field_rows[field]]
+        return np.sort(np.concatenate(rows)) if rows else np.zeros(0, dtype=np.int64)
+    
+    def _filter_rows(self, sources: List[str] = None, categories: List[str] = None) -> np.ndarray:
+        """Positions des chunks des sources et catégories données (None : pas de filtre)"""
+        if sources is None and categories is None:
+            return None
+        if sources is not None:
+            rows = self._rows_for('source', sources)
+            if categories is not None:
+                rows = np.intersect1d(rows, self._rows_for('category', categories))
+            return rows
+        return self._rows_for('category', categories)
+    
+    def sparse_search(self, query: str, top_k: int = 5, sources: List[str] = None,
+                      categories: List[str] = None) -> List[Dict]:
+        """
+        Recherche sparse (BM25), limitée aux documents sources / catégories si donnés
+        
+        Les scores BM25 ne sont pas bornés : relevance est le score divisé
+        par celui du meilleur chunk, pour rester comparable aux similarités
+        denses dans la fusion.
+        """
+        return self._results(*self._sparse_rows(query, top_k, sources, categories), 'sparse')
+    
+    def _sparse_rows(self, query: str, top_k: int = 5, sources: List[str] = None,
+                     categories: List[str] = None):
+        """Top-k BM25 en (lignes du chunk store, scores / meilleur score)"""
+        if self.sharded is not None and sources is None and categories is None:
+            rows, scores = self.sharded.sparse_top_k(query, top_k)
+        elif sources is None and categories is None:
+            rows, scores = self.bm25.top_k(query, top_k)
+        else:
+            rows = self._filter_rows(sources, categories)
+            if not len(rows):
+                return rows, np.zeros(0, dtype=np.float32)
+            rows, scores = self.bm25.top_k(query, top_k, rows=rows)
         
-        return dense_results
+        return rows, (scores / scores[0] if len(scores) else scores)
+    
+    @staticmethod
+    def _rank_sparse(rows: np.ndarray, scores: np.ndarray, top_k: int, allowed: np.ndarray = None):
+        """Top-k parmi les scores BM25 complets (BM25Index.scores), normalisés comme _sparse_rows"""
+        rows, scores = _top_within(rows, scores, top_k, allowed)
+        return rows, (scores / scores[0] if len(scores) else scores)
+    
+    def exact_search(self, query: str, top_k: int = 5, sources: List[str] = None,
+                     categories: List[str] = None) -> List[Dict]:
+        """
+        Recherche exacte (index de trigrammes) des termes "code" de la requête
+        
+        Identifiants (generate_tests), clés de config, ports, codes d'erreur
+        et phrases entre guillemets sont cherchés tels quels, sans tenir
+        compte de la casse. relevance est la moyenne, sur les termes, des
+        occurrences divisées par celles du meilleur chunk pour ce terme.
+        Requête sans terme "code" : aucun résultat.
+        """
+        return self._results(*self._exact_rows(query, top_k, sources, categories), 'exact')
+    
+    def _exact_rows(self, query: str, top_k: int = 5, sources: List[str] = None,
+                    categories: List[str] = None):
+        """Top-k exact en (lignes du chunk store, relevance)"""
+        terms = code_terms(query)
+        rows = self._filter_rows(sources, categories) if terms else None
+        if rows is not None and not len(rows):
+            terms = []
+        return self._rank_exact(self._exact_matches(terms, top_k, rows), top_k)
     
-    def sparse_search(self, query: str, top_k: int = 5) -> List[Dict]:
-        """Recherche sparse (TF-IDF)"""
-        query_vec = self.tfidf.transform([query])
-        similarities = cosine_similarity(query_vec, self.tfidf_matrix)[0]
-        top_indices = np.argsort(similarities)[::-1][:top_k]
-        
-        sparse_results = []
-        for idx in top_indices:
-            if similarities[idx] > 0:
-                chunk = self.chunks[idx]
-                sparse_results.append({
-                    'content': chunk['content'],
-                    'source': chunk['source'],
-                    'title': chunk['title'],
-                    'category': chunk.get('category', 'General'),
-                    'relevance': float(similarities[idx]),
-                    'method': 'sparse'
-                })
-        
-        return sparse_results
+    def _exact_matches(self, terms: List[str], top_k: int = None, rows: np.ndarray = None):
+        """
+        Correspondances de chaque terme parmi rows (None : tout le corpus)
+        
+        Returns:
+            [(lignes, occurrences)] par terme, occurrences décroissantes ;
+            toutes les correspondances si top_k est None
+        """
+        matches = []
+        for term in terms:
+            found = self.trigrams.search(term, top_k or len(self.trigrams), rows=rows)
+            found = np.array(found, dtype=np.int64).reshape(-1, 2)
+            matches.append((found[:, 0], found[:, 1]))
+        return matches
+    
+    @staticmethod
+    def _rank_exact(matches, top_k: int, allowed: np.ndarray = None):
+        """Top-k exact depuis les correspondances par terme (_exact_matches), restreint à allowed"""
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        term_rows, term_scores = [], []
+        for rows, occurrences in matches:
+            rows, occurrences = _top_within(rows, occurrences, top_k, allowed)
+            if len(rows):
+                term_rows.append(rows)
+                term_scores.append(occurrences / occurrences[0] / len(matches))
+        if not term_rows:
+            return empty
+        
+        unique, inverse = np.unique(np.concatenate(term_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(term_scores))
+        order = np.argsort(-scores, kind='stable')[:top_k]
+        return unique[order], scores[order]
     
     def sigmoid(self, x: float) -> float:
         """Fonction sigmoid pour normaliser"""
@@ -148,44 +350,119 @@ class HybridWikiRAG:
     def hybrid_search(self, query: str, top_k: int = 3, 
                       dense_weight: float = 0.7, 
                       sparse_weight: float = 0.3,
-                      use_reranking: bool = True) -> List[Dict]:
-        """Recherche hybride (dense + sparse + reranking)"""
+                      exact_weight: float = 0.3,
+                      use_reranking: bool = True,
+                      top_documents: int = None,
+                      category: str = None,
+                      fusion: str = DEFAULT_FUSION,
+                      rrf_k: int = DEFAULT_RRF_K) -> List[Dict]:
+        """
+        Recherche hybride (dense + sparse + reranking)
+        
+        Avec top_documents, recherche en deux niveaux : les top_documents
+        documents les plus proches (vecteur résumé par document) sont choisis
+        d'abord, puis seuls leurs chunks sont scorés en dense et en sparse.
+        
+        Avec category, seules les partitions de cette catégorie sont
+        parcourues. Sans category, le routeur peut en choisir une ; si la
+        partition routée ne suffit pas à remplir les résultats, la recherche
+        est refaite sur tout le corpus.
+        
+        Si la requête contient des identifiants, clés, ports ou phrases entre
+        guillemets, les chunks qui les contiennent tels quels (index de
+        trigrammes) s'ajoutent à la fusion avec exact_weight.
+        
+        fusion='weighted' somme les relevances pondérées par branche,
+        fusion='rrf' les weight / (rrf_k + rang) (fusion.py). La fusion se
+        fait par chunk sur des tableaux NumPy ; seuls les search_k premiers
+        chunks fusionnés sont lus dans le chunk store.
+        
+        Les branches sparse et exacte tournent dans self.executor pendant la
+        branche dense, encodage de la requête compris : la latence est celle
+        de la plus lente. Quand le filtre dépend de l'embedding (routage,
+        top_documents), elles sont lancées sur tout le corpus avant
+        l'encodage et filtrées ensuite ; le repli hors de la catégorie
+        routée ne relance que la recherche dense. Les durées de chaque
+        branche (ms, encodage inclus dans dense_ms) sont dans
+        result['timings'].
+        """
         search_k = top_k * 3 if use_reranking else top_k * 2
-        
-        dense_results = self.dense_search(query, top_k=search_k)
-        sparse_results = self.sparse_search(query, top_k=search_k)
-        
-        combined = {}
-        
-        # Combine dense results
-        for result in dense_results:
-            key = f"{result['source']}_{result['title']}"
-            combined[key] = {
-                **result,
-                'hybrid_score': result['relevance'] * dense_weight
-            }
-        
-        # Combine sparse results
-        for result in sparse_results:
-            key = f"{result['source']}_{result['title']}"
-            if key in combined:
-                combined[key]['hybrid_score'] += result['relevance'] * sparse_weight
-                combined[key]['method'] = 'hybrid'
-            else:
-                combined[key] = {
-                    **result,
-                    'hybrid_score': result['relevance'] * sparse_weight,
-                    'method': 'sparse_only'
-                }
-        
-        # Sort by hybrid score
-        sorted_results = sorted(combined.values(), 
-                               key=lambda x: x['hybrid_score'], 
-                               reverse=True)[:search_k]
+        search_start = time.perf_counter()
+        timings = {}
+        
+        def timed(name, fn, *args, **kwargs):
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            timings[f'{name}_ms'] = round((time.perf_counter() - start) * 1000, 2)
+            return result
+        
+        categories = [category] if category else None
+        routed = False
+        # L'embedding n'est attendu avant les recherches que s'il sert au routage
+        # ou au choix des documents ; sinon il est calculé dans la branche dense.
+        # Dans le premier cas, sparse et exact tournent pendant l'encodage sur
+        # tout le corpus et sont filtrés une fois le filtre connu
+        query_embedding = None
+        deferred = (categories is None and self.router is not None) or bool(top_documents)
+        if deferred:
+            terms = code_terms(query)
+            sparse_all = self.executor.submit(timed, 'sparse', self.bm25.scores, query)
+            exact_all = self.executor.submit(timed, 'exact', self._exact_matches, terms)
+            query_embedding = timed('encode', self.embedding_model.encode, query)
+        # Encodage compté dans la branche dense (avec les deux recherches en cas de repli)
+        timings['dense_ms'] = timings.get('encode_ms', 0.0)
+        if categories is None and self.router is not None:
+            routed_category = self.router.route(query_embedding)
+            if routed_category is not None:
+                print(f"  🧭 Routed to category: {routed_category}")
+                categories = [routed_category]
+                routed = True
+        
+        def retrieve(categories):
+            sources = None
+            if top_documents:
+                if hasattr(self.dense_index, 'top_documents'):
+                    sources = self.dense_index.top_documents(query_embedding, top_documents,
+                                                             categories=categories)
+                else:
+                    print("  ⚠️  Hierarchical search needs the numpy dense backend, searching all chunks")
+            if not deferred:
+                sparse = self.executor.submit(timed, 'sparse', self._sparse_rows, query,
+                                              top_k=search_k, sources=sources, categories=categories)
+                exact = self.executor.submit(timed, 'exact', self._exact_rows, query,
+                                             top_k=search_k, sources=sources, categories=categories)
+            start = time.perf_counter()
+            dense = self._dense_rows(query, top_k=search_k, sources=sources,
+                                     query_embedding=query_embedding, categories=categories)
+            timings['dense_ms'] = round(timings['dense_ms'] + (time.perf_counter() - start) * 1000, 2)
+            if not deferred:
+                return dense, sparse.result(), exact.result()
+            # Résultats complets calculés une fois, seul le filtre change
+            allowed = self._filter_rows(sources, categories)
+            return (dense, self._rank_sparse(*sparse_all.result(), search_k, allowed),
+                    self._rank_exact(exact_all.result(), search_k, allowed))
+        
+        dense_results, sparse_results, exact_results = retrieve(categories)
+        if routed and len(dense_results[0]) < search_k:
+            print("  🧭 Routed category too small, searching all categories")
+            dense_results, sparse_results, exact_results = retrieve(None)
+        # Du lancement des branches à la dernière terminée
+        timings['retrieve_ms'] = round((time.perf_counter() - search_start) * 1000, 2)
+        if len(exact_results[0]):
+            print(f"  🔎 Exact matches for code terms: {len(exact_results[0])}")
+        
+        rows, scores, masks = timed('fusion', fuse, [dense_results, sparse_results, exact_results],
+                                    [dense_weight, sparse_weight, exact_weight], fusion, rrf_k)
+        
+        # Dicts créés pour les seuls search_k premiers chunks fusionnés
+        methods = (_FUSED_METHODS.get(int(mask), 'hybrid') for mask in masks)
+        sorted_results = self._results(rows, scores, methods, limit=search_k)
+        for r in sorted_results:
+            r['hybrid_score'] = r['relevance']
         
         # Apply reranking
         if use_reranking and sorted_results:
-            sorted_results = self.rerank_results(query, sorted_results, top_k)
+            sorted_results = timed('rerank', self.rerank_results, query, sorted_results, top_k)
             for r in sorted_results:
                 r['relevance'] = r['rerank_score']
                 r['method'] = r['method'] + '+rerank'
@@ -194,6 +471,12 @@ class HybridWikiRAG:
             for r in sorted_results:
                 r['relevance'] = r['hybrid_score']
         
+        timings['total_ms'] = round((time.perf_counter() - search_start) * 1000, 2)
+        print(f"  ⏱️  Dense {timings['dense_ms']}ms | sparse {timings['sparse_ms']}ms | "
+              f"exact {timings['exact_ms']}ms | retrieval {timings['retrieve_ms']}ms")
+        for r in sorted_results:
+            r['timings'] = timings
+        
         return sorted_results
     
     def generate_answer(self, query: str, context: List[Dict], 
@@ -230,7 +513,9 @@ Instructions:
     
     def query(self, query: str, top_k: int = 3, 
              model: str = 'llama2',
-             use_reranking: bool = True) -> Dict:
+             use_reranking: bool = True,
+             top_documents: int = None,
+             category: str = None) -> Dict:
         """Pipeline complet RAG"""
         
         print(f"\n{'='*70}")
@@ -240,7 +525,8 @@ Instructions:
         start_time = time.time()
         
         # Search
-        docs = self.hybrid_search(query, top_k=top_k, use_reranking=use_reranking)
+        docs = self.hybrid_search(query, top_k=top_k, use_reranking=use_reranking,
+                                  top_documents=top_documents, category=category)
         
         if not docs:
             return {
@@ -267,7 +553,8 @@ Instructions:
                 for doc in docs
             ],
             'success': True,
-            'time_seconds': round(elapsed, 2)
+            'time_seconds': round(elapsed, 2),
+            'search_timings': docs[0]['timings']
         }
 
 
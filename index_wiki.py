@@ -1,113 +1,329 @@
 import os
 import re
+import time
 from pathlib import Path
 from sentence_transformers import SentenceTransformer
 import chromadb
-
-print("Starting Wiki Indexing...\n")
+from embedding_batcher import EmbeddingBatcher
+from embedding_cache import EmbeddingCache, text_hash
+from ingest import (pipelined_ingest, print_ingest_summary, hnsw_metadata, DEFAULT_BATCH_SIZE,
+                    collection_update, mark_collection_updated)
 
 # Configuration
 WIKI_DATA_DIR = "./wiki_data"
 CHROMA_DIR = "./chroma_data"
 MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+COLLECTION_NAME = "wiki_documents"
 
-# Initialize Chroma client
-client = chromadb.PersistentClient(path=CHROMA_DIR)
-
-# Delete existing collection if it exists
-try:
-    client.delete_collection("wiki_documents")
-    print("Deleted existing collection")
-except:
-    pass
+def chunk_markdown_file(filepath: str, wiki_dir: str = WIKI_DATA_DIR) -> list:
+    """
+    Découpe un fichier markdown en chunks indexables
+    
+    Returns:
+        Liste de (texte, metadata), une entrée par paragraphe/section
+    """
+    relative_path = os.path.relpath(filepath, wiki_dir)
+    file = os.path.basename(filepath)
+    
+    # Read markdown file
+    with open(filepath, 'r', encoding='utf-8') as f:
+        content = f.read()
+    
+    # Extract title from filename or first heading
+    title = file.replace('.md', '').replace('_', ' ').title()
+    
+    # Try to extract title from first heading
+    heading_match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
+    if heading_match:
+        title = heading_match.group(1)
+    
+    # Hash du fichier entier : la synchronisation initiale du mode watch
+    # ne ré-indexe que les fichiers dont il a changé
+    content_hash = text_hash(content)
+    
+    # Extract category from folder structure
+    category = os.path.basename(os.path.dirname(filepath))
+    if category == 'wiki_data':
+        category = 'General'
+    
+    # Split content into chunks (by paragraphs/sections)
+    # This prevents huge documents and creates multiple searchable chunks
+    chunks = content.split('\n\n')
+    chunks = [chunk.strip() for chunk in chunks if chunk.strip()]
+    
+    return [
+        (chunk, {
+            'source': relative_path,
+            'title': title,
+            'category': category,
+            'chunk': chunk_idx,
+            'file_hash': content_hash
+        })
+        for chunk_idx, chunk in enumerate(chunks)
+        if len(chunk) > 20  # Skip very small chunks
+    ]
 
-# Create new collection
-collection = client.get_or_create_collection("wiki_documents")
+def chunk_records(filepath: str, wiki_dir: str = WIKI_DATA_DIR) -> list:
+    """Chunks d'un fichier sous forme de (id stable, texte, metadata)"""
+    return [
+        (f"{metadata['source']}::{metadata['chunk']}", chunk, metadata)
+        for chunk, metadata in chunk_markdown_file(filepath, wiki_dir)
+    ]
 
-# Load embedding model
-print(f"Loading embedding model: {MODEL_NAME}")
-model = SentenceTransformer(MODEL_NAME)
+def scan_wiki_files(wiki_dir: str = WIKI_DATA_DIR) -> dict:
+    """État des fichiers markdown : {chemin: (mtime_ns, taille)}"""
+    state = {}
+    for root, dirs, files in os.walk(wiki_dir):
+        for file in files:
+            if file.endswith('.md'):
+                filepath = os.path.join(root, file)
+                try:
+                    stat = os.stat(filepath)
+                except FileNotFoundError:
+                    continue  # supprimé pendant le scan
+                state[filepath] = (stat.st_mtime_ns, stat.st_size)
+    return state
 
-# Track indexing stats
-doc_id = 0
-indexed_files = 0
-
-# Process markdown files
-print(f"\nScanning {WIKI_DATA_DIR} for markdown files...\n")
+def update_files(collection, encode, filepaths, batch_size: int = DEFAULT_BATCH_SIZE,
+                 wiki_dir: str = WIKI_DATA_DIR) -> dict:
+    """
+    Ré-indexe uniquement les fichiers donnés dans la collection live
+    
+    Les nouveaux chunks sont upsertés avant de supprimer ceux qui n'existent
+    plus : la collection ne passe jamais par un état vide pour ces fichiers.
+    Un fichier disparu voit tous ses chunks supprimés.
+    
+    Returns:
+        Statistiques d'ingestion, plus 'deleted' et 'failed' (fichiers
+        illisibles, laissés tels quels dans la collection)
+    """
+    records = []
+    stale_ids = []
+    failed = []
+    for filepath in sorted(filepaths):
+        relative_path = os.path.relpath(filepath, wiki_dir)
+        existing = set(collection.get(where={'source': relative_path}, include=[])['ids'])
+        
+        if os.path.exists(filepath):
+            try:
+                file_records = chunk_records(filepath, wiki_dir)
+            except Exception as e:
+                print(f"  ❌ Error processing {filepath}: {e}")
+                failed.append(filepath)
+                continue
+            records.extend(file_records)
+            existing -= {record[0] for record in file_records}
+            print(f"  ✓ {relative_path}: {len(file_records)} chunks, {len(existing)} stale")
+        else:
+            print(f"  ✓ {relative_path}: removed, {len(existing)} chunks deleted")
+        
+        stale_ids.extend(existing)
+    
+    stats = pipelined_ingest(collection, records, encode=encode,
+                             batch_size=batch_size, upsert=True, progress=False)
+    with collection_update(collection):
+        for start in range(0, len(stale_ids), batch_size):
+            collection.delete(ids=stale_ids[start:start + batch_size])
+    
+    stats['deleted'] = len(stale_ids)
+    stats['failed'] = failed
+    return stats
 
-if not os.path.exists(WIKI_DATA_DIR):
-    print(f"❌ Error: {WIKI_DATA_DIR} directory not found!")
-    exit()
+def changed_files(collection, state: dict, wiki_dir: str = WIKI_DATA_DIR) -> list:
+    """
+    Fichiers à ré-indexer pour que la collection reflète wiki_dir : ceux
+    dont le hash diffère du 'file_hash' indexé (ou sans chunk indexé), et
+    les sources indexées dont le fichier a disparu
+    """
+    indexed = {}
+    for metadata in collection.get(include=['metadatas'])['metadatas']:
+        if metadata and metadata.get('source'):
+            indexed.setdefault(metadata['source'], set()).add(metadata.get('file_hash'))
+    
+    changed = []
+    for filepath in state:
+        relative_path = os.path.relpath(filepath, wiki_dir)
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                current = text_hash(f.read())
+        except (OSError, UnicodeDecodeError):
+            current = None  # update_files signalera l'erreur
+        if indexed.get(relative_path) != {current}:
+            changed.append(filepath)
+    removed = [
+        os.path.join(wiki_dir, source)
+        for source in indexed
+        if os.path.join(wiki_dir, source) not in state
+    ]
+    return changed + removed
 
-for root, dirs, files in os.walk(WIKI_DATA_DIR):
-    for file in files:
-        if file.endswith('.md'):
-            filepath = os.path.join(root, file)
-            relative_path = os.path.relpath(filepath, WIKI_DATA_DIR)
+def watch_wiki(interval: float = 1.0, debounce: float = 2.0,
+               batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Surveille wiki_data/ et met à jour la collection au fil des modifications
+    
+    Les changements sont détectés par scrutation (mtime + taille, portable
+    Windows/Linux) toutes les `interval` secondes. Une rafale de
+    modifications n'est traitée qu'après `debounce` secondes de calme.
+    Les fichiers dont la mise à jour échoue restent en attente et sont
+    retentés après un nouveau délai de `debounce` secondes.
+    """
+    print("Starting Wiki watch mode...\n")
+    
+    client = chromadb.PersistentClient(path=CHROMA_DIR)
+    collection = client.get_or_create_collection(COLLECTION_NAME)
+    
+    print(f"Loading embedding model: {MODEL_NAME}")
+    model = SentenceTransformer(MODEL_NAME)
+    cache = EmbeddingCache(MODEL_NAME)
+    encode = EmbeddingBatcher(model, cache=cache).encode
+    
+    if not os.path.exists(WIKI_DATA_DIR):
+        print(f"❌ Error: {WIKI_DATA_DIR} directory not found!")
+        return
+    
+    # Synchronisation initiale (sans vider la collection) : seuls les
+    # fichiers modifiés depuis leur indexation sont ré-encodés
+    state = scan_wiki_files()
+    to_sync = changed_files(collection, state)
+    print(f"\nInitial sync: {len(to_sync)} of {len(state)} files changed...")
+    stats = update_files(collection, encode, to_sync, batch_size)
+    print(f"✅ Collection in sync: {collection.count()} chunks "
+          f"({stats['chunks']} upserted, {stats['deleted']} deleted)")
+    print(f"   {cache.summary()}")
+    
+    print(f"\n👀 Watching {WIKI_DATA_DIR} (poll {interval}s, debounce {debounce}s), Ctrl+C to stop")
+    # Fichiers en échec : retentés comme une modification
+    pending = set(stats['failed'])
+    last_change = time.time()
+    try:
+        while True:
+            time.sleep(interval)
+            current = scan_wiki_files()
+            changed = {
+                path for path in set(state) | set(current)
+                if state.get(path) != current.get(path)
+            }
+            state = current
             
-            print(f"Processing: {relative_path}")
+            if changed:
+                pending |= changed
+                last_change = time.time()
+                continue
             
-            try:
-                # Read markdown file
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # Extract title from filename or first heading
-                title = file.replace('.md', '').replace('_', ' ').title()
-                
-                # Try to extract title from first heading
-                heading_match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
-                if heading_match:
-                    title = heading_match.group(1)
-                
-                # Extract category from folder structure
-                category = os.path.basename(os.path.dirname(filepath))
-                if category == 'wiki_data':
-                    category = 'General'
-                
-                # Split content into chunks (by paragraphs/sections)
-                # This prevents huge documents and creates multiple searchable chunks
-                chunks = content.split('\n\n')
-                chunks = [chunk.strip() for chunk in chunks if chunk.strip()]
+            if pending and time.time() - last_change >= debounce:
+                print(f"\n🔄 {len(pending)} file(s) changed")
+                start = time.time()
+                try:
+                    stats = update_files(collection, encode, pending, batch_size)
+                except Exception as e:
+                    # Rien n'est perdu : les fichiers restent en attente
+                    print(f"❌ Update failed, retrying in {debounce}s: {e}")
+                    last_change = time.time()
+                    continue
+                print(f"✅ Updated in {time.time() - start:.2f}s: {stats['chunks']} chunks upserted, "
+                      f"{stats['deleted']} deleted, collection has {collection.count()} chunks")
+                pending = set(stats['failed'])
+                if pending:
+                    print(f"   ⚠️  {len(pending)} file(s) failed, retrying in {debounce}s")
+                    last_change = time.time()
+    except KeyboardInterrupt:
+        print("\n👋 Watch mode stopped")
+
+def index_wiki(batch_size: int = DEFAULT_BATCH_SIZE):
+    """Reconstruit la collection wiki_documents à partir de wiki_data/"""
+    print("Starting Wiki Indexing...\n")
+    
+    # Initialize Chroma client
+    client = chromadb.PersistentClient(path=CHROMA_DIR)
+    
+    # Delete existing collection if it exists
+    try:
+        client.delete_collection(COLLECTION_NAME)
+        print("Deleted existing collection")
+    except:
+        pass
+    
+    # Create new collection
+    collection = client.get_or_create_collection(COLLECTION_NAME, metadata=hnsw_metadata())
+    mark_collection_updated(collection)
+    
+    # Load embedding model
+    print(f"Loading embedding model: {MODEL_NAME}")
+    model = SentenceTransformer(MODEL_NAME)
+    cache = EmbeddingCache(MODEL_NAME)
+    
+    # Track indexing stats
+    records = []
+    indexed_files = 0
+    
+    # Process markdown files
+    print(f"\nScanning {WIKI_DATA_DIR} for markdown files...\n")
+    
+    if not os.path.exists(WIKI_DATA_DIR):
+        print(f"❌ Error: {WIKI_DATA_DIR} directory not found!")
+        return
+    
+    for root, dirs, files in os.walk(WIKI_DATA_DIR):
+        for file in files:
+            if file.endswith('.md'):
+                filepath = os.path.join(root, file)
+                relative_path = os.path.relpath(filepath, WIKI_DATA_DIR)
                 
-                # Index each chunk
-                for chunk_idx, chunk in enumerate(chunks):
-                    if len(chunk) > 20:  # Skip very small chunks
-                        doc_id += 1
-                        
-                        # Generate embedding
-                        embedding = model.encode(chunk)
-                        
-                        # Add to collection
-                        collection.add(
-                            ids=[str(doc_id)],
-                            embeddings=[embedding.tolist()],
-                            documents=[chunk],
-                            metadatas=[{
-                                'source': relative_path,
-                                'title': title,
-                                'category': category,
-                                'chunk': chunk_idx
-                            }]
-                        )
+                print(f"Processing: {relative_path}")
                 
-                indexed_files += 1
-                print(f"  ✓ Added {len(chunks)} chunks\n")
+                try:
+                    chunks = chunk_records(filepath)
+                    records.extend(chunks)
+                    
+                    indexed_files += 1
+                    print(f"  ✓ Chunked into {len(chunks)} chunks\n")
                 
-            except Exception as e:
-                print(f"  ❌ Error processing {filepath}: {e}\n")
-
-# Print summary
-print("="*70)
-print("INDEXING COMPLETE")
-print("="*70)
-print(f"Files indexed: {indexed_files}")
-print(f"Total chunks: {doc_id}")
-print(f"Collection: wiki_documents")
-print(f"Database: {CHROMA_DIR}")
-print("="*70)
+                except Exception as e:
+                    print(f"  ❌ Error processing {filepath}: {e}\n")
+    
+    # Encode et écrit par lots, encodage et écriture Chroma en parallèle
+    print(f"Embedding {len(records)} chunks (batch size {batch_size})...")
+    stats = pipelined_ingest(
+        collection,
+        records,
+        encode=EmbeddingBatcher(model, cache=cache).encode,
+        batch_size=batch_size
+    )
+    doc_id = stats['chunks']
+    
+    # Print summary
+    print("="*70)
+    print("INDEXING COMPLETE")
+    print("="*70)
+    print(f"Files indexed: {indexed_files}")
+    print(f"Total chunks: {doc_id}")
+    print(f"Collection: {COLLECTION_NAME}")
+    print(f"Database: {CHROMA_DIR}")
+    print_ingest_summary(stats)
+    print(f"      {cache.summary()}")
+    print("="*70)
+    
+    if doc_id > 0:
+        print("✅ Wiki documents successfully indexed!")
+    else:
+        print("❌ No documents were indexed. Check your wiki_data folder.")
 
-if doc_id > 0:
-    print("✅ Wiki documents successfully indexed!")
-else:
-    print("❌ No documents were indexed. Check your wiki_data folder.")
\ No newline at end of file
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Index wiki_data/ into the wiki_documents collection")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Chunks per encode/write batch")
+    parser.add_argument('--watch', action='store_true',
+                        help="Keep running and re-index changed files incrementally")
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help="Watch mode: seconds between scans of wiki_data/")
+    parser.add_argument('--debounce', type=float, default=2.0,
+                        help="Watch mode: quiet seconds before applying a burst of edits")
+    args = parser.parse_args()
+    
+    if args.watch:
+        watch_wiki(interval=args.interval, debounce=args.debounce, batch_size=args.batch_size)
+    else:
+        index_wiki(batch_size=args.batch_size)
@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Un enregistrement à indexer : (id, texte, metadata)
+Record = Tuple[str, str, Dict]
+
+DEFAULT_BATCH_SIZE = 64
+# Paramètres HNSW retenus par tune_hnsw.py
+HNSW_PARAMS_FILE = 'processed_wiki/hnsw_params.json'
+# Tampon de mise à jour de chaque collection (un fichier par nom de collection)
+COLLECTION_STAMPS_DIR = 'processed_wiki/collection_stamps'
+
+
+def hnsw_metadata(metadata: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Metadata de création d'une collection, complétées par les paramètres
+    HNSW réglés (tune_hnsw.py) ; None si elles restent vides (Chroma
+    refuse un dict vide)
+    """
+    metadata = dict(metadata or {})
+    if os.path.exists(HNSW_PARAMS_FILE):
+        with open(HNSW_PARAMS_FILE, 'r', encoding='utf-8') as f:
+            params = json.load(f)['params']
+        for key, value in params.items():
+            metadata.setdefault(f'hnsw:{key}', value)
+    return metadata or None
+
+
+def _stamp_path(collection) -> str:
+    return os.path.join(COLLECTION_STAMPS_DIR, f"{collection.name}.stamp")
+
+
+def collection_stamp(collection) -> Optional[str]:
+    """Tampon de la dernière écriture dans la collection (None si aucune n'a été marquée)"""
+    path = _stamp_path(collection)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+
+def mark_collection_updated(collection):
+    """Change le tampon de la collection (écriture atomique)"""
+    path = _stamp_path(collection)
+    os.makedirs(COLLECTION_STAMPS_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def collection_update(collection):
+    """
+    Encadre une écriture dans la collection : le tampon change avant et
+    après, un export lu avant la fin de l'écriture (même interrompue) ne
+    correspond donc plus au tampon courant
+    """
+    mark_collection_updated(collection)
+    try:
+        yield
+    finally:
+        mark_collection_updated(collection)
+
+
+def _batches(records: Iterable[Record], batch_size: int):
+    """Regroupe les enregistrements par lots de batch_size"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def job_fingerprint(records: List[Record], batch_size: int) -> str:
+    """Empreinte d'un job d'ingestion (mêmes enregistrements, même découpage en lots)"""
+    h = hashlib.sha256(str(batch_size).encode('utf-8'))
+    for record_id, text, _ in records:
+        h.update(record_id.encode('utf-8'))
+        h.update(b'\x00')
+        h.update(text.encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+class IngestCheckpoint:
+    """
+    Progression durable d'un job d'ingestion, lot par lot
+    
+    Le fichier JSON est réécrit de façon atomique (fichier temporaire +
+    os.replace) après chaque lot écrit dans Chroma. Après un crash, un
+    job avec la même empreinte reprend après le dernier lot validé.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.data = None
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+    
+    def start(self, fingerprint: str, total_batches: int, **extra) -> int:
+        """
+        Démarre (ou reprend) un job
+        
+        Returns:
+            Nombre de lots déjà validés (0 si nouveau job)
+        """
+        if self.data and self.data.get('fingerprint') == fingerprint:
+            return self.data['committed_batches']
+        self.data = {
+            'fingerprint': fingerprint,
+            'total_batches': total_batches,
+            'committed_batches': 0,
+            'committed_chunks': 0,
+            **extra
+        }
+        self._save()
+        return 0
+    
+    def commit(self, batches: int, chunks: int):
+        """Enregistre qu'un lot de plus est écrit"""
+        self.data['committed_batches'] = batches
+        self.data['committed_chunks'] = chunks
+        self.data['updated'] = time.time()
+        self._save()
+    
+    def clear(self):
+        """Supprime le checkpoint (job terminé et vérifié)"""
+        self.data = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+    
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def pipelined_ingest(collection, records: Iterable[Record],
+                     encode: Callable[[List[str]], List[List[float]]],
+                     batch_size: int = DEFAULT_BATCH_SIZE,
+                     upsert: bool = False,
+                     progress: bool = True,
+                     checkpoint: Optional[IngestCheckpoint] = None,
+                     skip_batches: int = 0) -> Dict:
+    """
+    Encode et écrit des enregistrements dans une collection Chroma par lots
+    
+    L'écriture du lot N tourne dans un thread dédié pendant que le thread
+    principal encode le lot N+1 (les deux passent l'essentiel de leur
+    temps dans du code natif qui relâche le GIL).
+    
+    Args:
+        collection: Collection Chroma cible
+        records: Itérable de (id, texte, metadata)
+        encode: Fonction liste de textes -> liste d'embeddings
+        batch_size: Nombre d'enregistrements par encode / écriture
+        upsert: Utiliser collection.upsert au lieu de collection.add
+        progress: Afficher la progression par lot
+        checkpoint: Checkpoint mis à jour après chaque lot écrit
+        skip_batches: Lots déjà validés à ne pas ré-encoder (reprise)
+    
+    Returns:
+        Statistiques d'ingestion (voir print_ingest_summary)
+    """
+    write = collection.upsert if upsert else collection.add
+    stats = {
+        'chunks': 0,
+        'batches': 0,
+        'encode_seconds': 0.0,
+        'write_seconds': 0.0,
+        'wall_seconds': 0.0,
+        'batch_size': batch_size,
+        'skipped_batches': 0
+    }
+    
+    def write_batch(ids, texts, metadatas, embeddings, batch_no, chunks_done):
+        start = time.perf_counter()
+        write(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
+        if checkpoint is not None:
+            checkpoint.commit(batch_no, chunks_done)
+        return time.perf_counter() - start
+    
+    wall_start = time.perf_counter()
+    pending = None
+    batch_no = 0
+    chunks_done = 0
+    
+    with collection_update(collection), ThreadPoolExecutor(max_workers=1) as writer:
+        for batch in _batches(records, batch_size):
+            batch_no += 1
+            chunks_done += len(batch)
+            if batch_no <= skip_batches:
+                stats['skipped_batches'] += 1
+                continue
+            
+            ids = [record[0] for record in batch]
+            texts = [record[1] for record in batch]
+            metadatas = [record[2] for record in batch]
+            
+            start = time.perf_counter()
+            embeddings = encode(texts)
+            if hasattr(embeddings, 'tolist'):
+                embeddings = embeddings.tolist()
+            stats['encode_seconds'] += time.perf_counter() - start
+            
+            # Attendre l'écriture précédente avant de lancer la suivante :
+            # un seul lot en vol, les écritures restent dans l'ordre
+            if pending is not None:
+                stats['write_seconds'] += pending.result()
+            pending = writer.submit(write_batch, ids, texts, metadatas, embeddings,
+                                    batch_no, chunks_done)
+            
+            stats['chunks'] += len(batch)
+            stats['batches'] += 1
+            if progress:
+                print(f"   📝 Batch {batch_no}: {chunks_done} chunks encoded")
+        
+        if pending is not None:
+            stats['write_seconds'] += pending.result()
+    
+    stats['wall_seconds'] = time.perf_counter() - wall_start
+    return stats
+
+
+def verify_collection(collection, expected_ids: List[str],
+                      batch_size: int = DEFAULT_BATCH_SIZE) -> List[str]:
+    """Vérifie que tous les IDs attendus sont dans la collection, retourne les manquants"""
+    missing = []
+    for start in range(0, len(expected_ids), batch_size):
+        batch = expected_ids[start:start + batch_size]
+        found = set(collection.get(ids=batch, include=[])['ids'])
+        missing.extend(record_id for record_id in batch if record_id not in found)
+    return missing
+
+
+def print_ingest_summary(stats: Dict):
+    """Affiche le débit d'une ingestion"""
+    wall = max(stats['wall_seconds'], 1e-9)
+    serial = stats['encode_seconds'] + stats['write_seconds']
+    print("\n   Ingestion summary:")
+    print(f"      Chunks: {stats['chunks']} in {stats['batches']} batches "
+          f"(batch size {stats['batch_size']})")
+    if stats.get('skipped_batches'):
+        print(f"      Resumed: {stats['skipped_batches']} batches already committed by a previous run")
+    print(f"      Encode: {stats['encode_seconds']:.2f}s | "
+          f"Write: {stats['write_seconds']:.2f}s | Wall: {stats['wall_seconds']:.2f}s")
+    print(f"      Throughput: {stats['chunks'] / wall:.1f} chunks/sec")
+    if serial > 0:
+        print(f"      Overlap saved: {max(serial - stats['wall_seconds'], 0):.2f}s")
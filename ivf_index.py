@@ -0,0 +1,238 @@
+import os
+import json
+import time
+from typing import Optional
+import numpy as np
+
+# Fichiers d'un index partitionné, écrits dans le dossier de l'index dense
+# (voir dense_index.py) avec un préfixe : 'ivf' (k-means) ou 'doc' (documents)
+IVF_PREFIX = 'ivf'
+
+
+def _partition_file(path: str, prefix: str, name: str) -> str:
+    return os.path.join(path, f"{prefix}{name}")
+
+DEFAULT_NPROBE = 8
+# Points d'entraînement k-means par partition (au-delà, échantillon aléatoire)
+TRAIN_POINTS_PER_LIST = 256
+_ASSIGN_BLOCK = 16384
+
+
+def default_n_lists(count: int) -> int:
+    """Nombre de partitions par défaut : ~4 * sqrt(n)"""
+    return max(1, min(count, int(4 * np.sqrt(count))))
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Partition la plus proche (cosinus) de chaque vecteur, par blocs"""
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _ASSIGN_BLOCK):
+        block = np.asarray(vectors[start:start + _ASSIGN_BLOCK], dtype=np.float32)
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(vectors: np.ndarray, n_lists: int, iterations: int = 20,
+                     seed: int = 0) -> np.ndarray:
+    """
+    k-means sphérique (vecteurs et centroïdes normalisés, similarité cosinus)
+    
+    Returns:
+        Centroïdes float32 (n_lists, dim)
+    """
+    rng = np.random.RandomState(seed)
+    centroids = np.array(vectors[rng.choice(len(vectors), n_lists, replace=False)],
+                         dtype=np.float32)
+    
+    for _ in range(iterations):
+        labels = _assign(vectors, centroids)
+        counts = np.bincount(labels, minlength=n_lists)
+        
+        # Somme des vecteurs de chaque partition (tri puis reduceat, sans boucle Python)
+        order = np.argsort(labels, kind='stable')
+        present, starts = np.unique(labels[order], return_index=True)
+        sums = np.zeros_like(centroids)
+        sums[present] = np.add.reduceat(vectors[order], starts, axis=0)
+        
+        # Partition vide : la relancer sur un point au hasard
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        new_centroids = sums / norms
+        shift = float(np.max(1 - np.sum(new_centroids * centroids, axis=1)))
+        centroids = new_centroids
+        if shift < 1e-6:
+            break
+    
+    return centroids.astype(np.float32)
+
+
+def _write_atomic(path: str, data: bytes):
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def write_partitions(path: str, prefix: str, vectors: np.ndarray, labels: np.ndarray,
+                     centroids: np.ndarray, **extra) -> dict:
+    """
+    Écrit un index partitionné : vecteurs recopiés dans l'ordre des
+    partitions ({prefix}_vectors.f32), position d'origine de chaque ligne
+    ({prefix}_rows.u32), bornes des partitions ({prefix}_offsets.u64),
+    centroïdes, puis {prefix}.json en dernier
+    
+    Returns:
+        Métadonnées écrites dans {prefix}.json
+    """
+    count, dim = vectors.shape
+    n_lists = len(centroids)
+    order = np.argsort(labels, kind='stable')
+    offsets = np.zeros(n_lists + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum(np.bincount(labels, minlength=n_lists))
+    
+    vectors_path = _partition_file(path, prefix, '_vectors.f32')
+    with open(vectors_path + '.tmp', 'wb') as f:
+        for block_start in range(0, count, _ASSIGN_BLOCK):
+            f.write(np.asarray(vectors[order[block_start:block_start + _ASSIGN_BLOCK]]).tobytes())
+    os.replace(vectors_path + '.tmp', vectors_path)
+    _write_atomic(_partition_file(path, prefix, '_rows.u32'), order.astype(np.uint32).tobytes())
+    _write_atomic(_partition_file(path, prefix, '_offsets.u64'), offsets.tobytes())
+    _write_atomic(_partition_file(path, prefix, '_centroids.f32'),
+                  np.asarray(centroids, dtype=np.float32).tobytes())
+    
+    sizes = np.diff(offsets.astype(np.int64))
+    meta = {
+        'count': count,
+        'dim': dim,
+        'n_lists': n_lists,
+        'largest_list': int(sizes.max()),
+        'empty_lists': int(np.sum(sizes == 0)),
+        **extra
+    }
+    _write_atomic(_partition_file(path, prefix, '.json'), json.dumps(meta).encode('utf-8'))
+    return meta
+
+
+def build_ivf(path: str, n_lists: Optional[int] = None, iterations: int = 20,
+              seed: int = 0) -> dict:
+    """
+    Construit l'index IVF d'un index dense exporté (hors ligne)
+    
+    Les vecteurs sont partitionnés par k-means, puis recopiés dans l'ordre
+    des partitions (ivf_vectors.f32) : sonder une partition revient à lire
+    une tranche contiguë. ivf_rows.u32 ramène chaque ligne à sa position
+    dans l'index dense, ivf.json est écrit en dernier.
+    
+    Returns:
+        Statistiques de construction
+    """
+    with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    count, dim = meta['count'], meta['dim']
+    if not count:
+        raise ValueError(f"Dense index {path} is empty")
+    n_lists = min(n_lists or default_n_lists(count), count)
+    
+    start = time.time()
+    vectors = np.memmap(os.path.join(path, 'vectors.f32'), dtype=np.float32,
+                        mode='r', shape=(count, dim))
+    
+    # Entraînement sur un échantillon, affectation de tout le corpus
+    rng = np.random.RandomState(seed)
+    train_size = min(count, n_lists * TRAIN_POINTS_PER_LIST)
+    train_rows = np.sort(rng.choice(count, train_size, replace=False))
+    centroids = spherical_kmeans(np.asarray(vectors[train_rows]), n_lists, iterations, seed)
+    labels = _assign(vectors, centroids)
+    
+    return write_partitions(path, IVF_PREFIX, vectors, labels, centroids,
+                            build_seconds=round(time.time() - start, 2))
+
+
+class IVFIndex:
+    """
+    Index à fichiers inversés : seules les nprobe partitions dont le
+    centroïde est le plus proche de la requête sont parcourues
+    """
+    
+    def __init__(self, path: str, prefix: str = IVF_PREFIX):
+        with open(_partition_file(path, prefix, '.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        count, dim, n_lists = self.meta['count'], self.meta['dim'], self.meta['n_lists']
+        self.n_lists = n_lists
+        self.centroids = np.fromfile(_partition_file(path, prefix, '_centroids.f32'),
+                                     dtype=np.float32).reshape(n_lists, dim)
+        self.offsets = np.fromfile(_partition_file(path, prefix, '_offsets.u64'),
+                                   dtype=np.uint64).astype(np.int64)
+        self.rows = np.memmap(_partition_file(path, prefix, '_rows.u32'), dtype=np.uint32,
+                              mode='r', shape=(count,))
+        self.vectors = np.memmap(_partition_file(path, prefix, '_vectors.f32'), dtype=np.float32,
+                                 mode='r', shape=(count, dim))
+    
+    @staticmethod
+    def available(path: str, count: int, prefix: str = IVF_PREFIX) -> bool:
+        """Index partitionné construit et à jour pour un index dense de count vecteurs"""
+        meta_path = _partition_file(path, prefix, '.json')
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('count') == count
+    
+    def nearest_lists(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Partitions dont le centroïde est le plus proche, triées par score"""
+        nprobe = min(nprobe, self.n_lists)
+        centroid_scores = self.centroids @ query
+        if nprobe < self.n_lists:
+            lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            lists = np.arange(self.n_lists)
+        return lists[np.argsort(-centroid_scores[lists], kind='stable')]
+    
+    def top_k(self, query: np.ndarray, top_k: int = 5, nprobe: int = DEFAULT_NPROBE,
+              lists=None):
+        """
+        Top-k exact à l'intérieur des nprobe partitions sondées (ou des
+        partitions données)
+        
+        Returns:
+            (rows, scores) triés par score décroissant, rows dans l'index dense
+        """
+        if lists is None:
+            lists = self.nearest_lists(query, nprobe)
+        lists = np.sort(np.asarray(lists, dtype=np.int64))
+        
+        positions = np.concatenate([
+            np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists
+        ]) if len(lists) else np.zeros(0, dtype=np.int64)
+        if not len(positions):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        
+        scores = np.concatenate([
+            self.vectors[self.offsets[l]:self.offsets[l + 1]] @ query for l in lists
+        ])
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return self.rows[positions[best]].astype(np.int64), scores[best]
+
+
+if __name__ == '__main__':
+    import argparse
+    from dense_index import dense_index_path
+    
+    parser = argparse.ArgumentParser(description="Build the IVF partition index over an exported dense index")
+    parser.add_argument('--collection', default='wiki')
+    parser.add_argument('--persist-directory', default='./chroma_data')
+    parser.add_argument('--lists', type=int, default=None,
+                        help="Number of k-means partitions (default ~4*sqrt(n))")
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+    
+    index_path = dense_index_path(args.collection, args.persist_directory)
+    print(f"Building IVF index for {index_path}...")
+    stats = build_ivf(index_path, n_lists=args.lists, iterations=args.iterations)
+    print(f"✅ {stats['n_lists']} partitions over {stats['count']} vectors "
+          f"(largest {stats['largest_list']}, {stats['empty_lists']} empty) "
+          f"in {stats['build_seconds']}s")
@@ -0,0 +1,89 @@
+import re
+import zlib
+from typing import Dict, List, Optional
+import numpy as np
+
+# Paramètres MinHash (mêmes constantes que datasketch)
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """Ensemble des n-grammes de mots (minuscules) d'un texte"""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class NearDuplicateDetector:
+    """
+    Détection de quasi-doublons par MinHash + LSH (banding)
+    
+    Les textes sont ajoutés un par un ; chaque texte est comparé aux
+    textes déjà vus qui partagent au moins une bande LSH, et déclaré
+    doublon du premier dont la similarité de Jaccard estimée dépasse
+    le seuil. Le premier texte vu reste donc toujours le canonique.
+    """
+    
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128,
+                 bands: int = 16, shingle_size: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, (1 << 32) - 1, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, (1 << 32) - 1, size=num_perm, dtype=np.uint64)
+        
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[str, np.ndarray] = {}
+    
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """Signature MinHash d'un texte (None si le texte n'a aucun mot)"""
+        grams = shingles(text, self.shingle_size)
+        if not grams:
+            return None
+        hashes = np.fromiter(
+            (zlib.crc32(g.encode('utf-8')) for g in grams),
+            dtype=np.uint64, count=len(grams)
+        )
+        # (a * h + b) mod p, une ligne par permutation
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=1)
+    
+    def add(self, key: str, text: str) -> Optional[str]:
+        """
+        Enregistre un texte
+        
+        Returns:
+            La clé du texte canonique dont il est un quasi-doublon, ou None
+        """
+        sig = self.signature(text)
+        if sig is None:
+            return None
+        
+        band_keys = [sig[i * self.rows:(i + 1) * self.rows].tobytes()
+                     for i in range(self.bands)]
+        
+        seen = set()
+        for band, band_key in enumerate(band_keys):
+            for candidate in self._buckets[band].get(band_key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                similarity = float(np.mean(self._signatures[candidate] == sig))
+                if similarity >= self.threshold:
+                    return candidate
+        
+        # Nouveau texte canonique
+        self._signatures[key] = sig
+        for band, band_key in enumerate(band_keys):
+            self._buckets[band].setdefault(band_key, []).append(key)
+        return None
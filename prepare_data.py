@@ -103,10 +103,10 @@ def process_wiki():
                 'chunk_id': i
             })
     
-    # Sauvegarder chunks
+    # Sauvegarder chunks (JSONL + index d'offsets)
     import json
-    with open(f'{output_dir}/chunks.json', 'w', encoding='utf-8') as f:
-        json.dump(all_chunks, f, ensure_ascii=False, indent=2)
+    from chunk_store import write_chunks, CHUNKS_FILE
+    write_chunks(all_chunks, CHUNKS_FILE)
     
     # Sauvegarder infos documents
     with open(f'{output_dir}/documents_info.json', 'w', encoding='utf-8') as f:
@@ -1,15 +1,25 @@
 import chromadb
 from sentence_transformers import SentenceTransformer
 import os
-from typing import List, Dict
+from typing import List, Dict, Optional
 import json
-import time # Added import for time used in add_documents
+import hashlib
+from embedding_batcher import EmbeddingBatcher
+from embedding_cache import EmbeddingCache
+from ingest import hnsw_metadata, collection_update, mark_collection_updated
+from dense_index import open_dense_index, dense_index_path, DEFAULT_DENSE_BACKEND
+from category_router import CategoryRouter
+from wiki_processor import detect_category
 
 class RAGPipeline:
     def __init__(self, 
                  collection_name="wiki_data",
                  embedding_model="all-MiniLM-L6-v2",
-                 persist_directory="./chroma_db"):
+                 persist_directory="./chroma_db",
+                 dense_backend=DEFAULT_DENSE_BACKEND,
+                 dense_precision=None,
+                 dense_dims=None,
+                 route_categories=True):
         """
         Initialise le pipeline RAG
         """
@@ -20,6 +30,11 @@ class RAGPipeline:
         
         self.embedding_model = SentenceTransformer(embedding_model, cache_folder='./model_cache')
         
+        # Lots d'encodage dimensionnés en tokens (peu de padding), avec cache
+        # disque : un rechargement ne ré-encode que les textes jamais vus
+        self.embedding_cache = EmbeddingCache(embedding_model)
+        self.batcher = EmbeddingBatcher(self.embedding_model, cache=self.embedding_cache)
+        
         # Initialiser Chroma client
         self.client = chromadb.PersistentClient(path=persist_directory)
         
@@ -29,92 +44,140 @@ class RAGPipeline:
             metadata={"hnsw:space": "cosine"}
         )
         
+        # Backend dense : matrice NumPy en memmap, resynchronisée après chaque écriture
+        self.dense_backend = dense_backend
+        self.dense_precision = dense_precision
+        self.dense_dims = dense_dims
+        self.dense_index_path = dense_index_path(collection_name, persist_directory)
+        self.dense_index = open_dense_index(dense_backend, self.collection, self.dense_index_path,
+                                            model_name=embedding_model,
+                                            precision=dense_precision,
+                                            dims=dense_dims)
+        # Routeur requête -> catégorie quand l'appelant n'en donne pas
+        self.route_categories = route_categories
+        self.router = CategoryRouter.from_dense_index(self.dense_index) if route_categories else None
+        
         print(f"✅ RAG Pipeline initialized")
         print(f"   Collection: {collection_name}")
         print(f"   Documents: {self.collection.count()}")
     
-    def add_documents(self, documents: List[Dict]):
+    def _document_id(self, doc: Dict, position: int) -> str:
+        """
+        ID déterministe d'un chunk : source + position du chunk + hash du contenu
+        """
+        source = doc.get('source', 'Unknown')
+        chunk_index = doc.get('chunk_index', position)
+        digest = hashlib.sha1(doc['content'].encode('utf-8')).hexdigest()[:16]
+        return f"{source}::{chunk_index}::{digest}"
+    
+    def add_documents(self, documents: List[Dict], batch_size: int = 100):
         """
-        Ajoute des documents à la knowledge base
+        Ajoute des documents à la knowledge base (idempotent : upsert sur des IDs stables)
         """
         if not documents:
             print("⚠️ No documents to add")
             return
         
+        # Dédupliquer sur l'ID stable (Chroma refuse les IDs dupliqués dans un même appel)
+        unique = {}
+        for i, doc in enumerate(documents):
+            unique.setdefault(self._document_id(doc, i), doc)
+        ids = list(unique.keys())
+        documents = list(unique.values())
+        
         # Préparer les données
         texts = [doc['content'] for doc in documents]
         metadatas = [
             {
                 'title': doc.get('title', 'Unknown'),
-                'source': doc.get('source', 'Unknown')
+                'source': doc.get('source', 'Unknown'),
+                'category': doc.get('category') or detect_category(doc.get('source', ''), doc['content'])
             }
             for doc in documents
         ]
         
-        # Générer IDs uniques basés sur le timestamp et index
-        timestamp = int(time.time() * 1000)
-        ids = [f"doc_{timestamp}_{i}" for i in range(len(documents))]
-        
         # Générer embeddings
         print(f"🔄 Generating embeddings for {len(documents)} documents...")
-        embeddings = self.embedding_model.encode(texts).tolist()
-        
-        # Ajouter à Chroma
-        try:
-            self.collection.add(
-                embeddings=embeddings,
-                documents=texts,
-                metadatas=metadatas,
-                ids=ids
-            )
-            print(f"✅ Added {len(documents)} documents to knowledge base")
-        except Exception as e:
-            print(f"⚠️ Error adding documents: {e}")
-            print("   Trying to upsert instead...")
-            self.collection.upsert(
-                embeddings=embeddings,
-                documents=texts,
-                metadatas=metadatas,
-                ids=ids
-            )
-            print(f"✅ Upserted {len(documents)} documents to knowledge base")
+        embeddings = self.batcher.encode(texts).tolist()
+        print(f"   {self.embedding_cache.summary()}")
+        
+        # Upsert dans Chroma par lots : recharger les mêmes fichiers ne duplique rien
+        with collection_update(self.collection):
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                self.collection.upsert(
+                    embeddings=embeddings[start:end],
+                    documents=texts[start:end],
+                    metadatas=metadatas[start:end],
+                    ids=ids[start:end]
+                )
+        print(f"✅ Upserted {len(documents)} documents to knowledge base")
+        self._refresh_dense_index()
+    
+    def _refresh_dense_index(self):
+        """
+        Ré-exporte l'index dense après une modification de la collection
+        """
+        self.dense_index.close()
+        # Garder la précision et la dimension réduite de l'index courant
+        precision = getattr(self.dense_index, 'precision', self.dense_precision)
+        dims = getattr(self.dense_index, 'dims', self.dense_dims)
+        self.dense_index = open_dense_index(self.dense_backend, self.collection,
+                                            self.dense_index_path, rebuild=True,
+                                            model_name=self.embedding_cache.model_name,
+                                            precision=precision, dims=dims)
+        if self.route_categories:
+            self.router = CategoryRouter.from_dense_index(self.dense_index)
     
     # 🎯 CRITICAL FIX HERE: Change return type from List[Dict] to Dict
-    def search(self, query: str, top_k: int = 3) -> Dict:
+    def search(self, query: str, top_k: int = 3, category: Optional[str] = None) -> Dict:
         """
         Recherche les documents pertinents et formate le résultat en un dictionnaire RAG
         
+        category limite la recherche à une catégorie ; sans category, le
+        routeur choisit une catégorie si l'une d'elles se détache.
+        
         Returns:
-            Dict: {'context': str, 'sources': List[Dict], 'type': str}
+            Dict: {'context': str, 'sources': List[Dict], 'type': str, 'category': Optional[str]}
         """
         if self.collection.count() == 0:
             print("⚠️ Knowledge base is empty")
             return {
                 "context": "Knowledge base is empty. Cannot retrieve information.",
                 "sources": [],
-                "type": "no_rag"
+                "type": "no_rag",
+                "category": category
             }
         
         # Générer embedding de la query
         query_embedding = self.embedding_model.encode([query]).tolist()[0]
         
-        # Rechercher dans Chroma
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k
-        )
+        # Catégorie demandée, sinon routée si une catégorie se détache
+        categories = [category] if category else None
+        routed = False
+        if categories is None and self.router is not None:
+            routed_category = self.router.route(query_embedding)
+            if routed_category is not None:
+                categories = [routed_category]
+                routed = True
+        
+        # Rechercher dans l'index dense (NumPy ou Chroma), partitions de la catégorie seulement
+        hits = self.dense_index.search(query_embedding, top_k=top_k, categories=categories)
+        if routed and len(hits) < top_k:
+            # Partition routée trop petite : recherche sur tout le corpus
+            categories = None
+            hits = self.dense_index.search(query_embedding, top_k=top_k)
         
         documents = []
-        if results['documents'] and results['documents'][0]:
-            for i in range(len(results['documents'][0])):
-                # 1. Format the list of source documents
-                doc = {
-                    'content': results['documents'][0][i],
-                    'title': results['metadatas'][0][i].get('title', 'Unknown'),
-                    'source': results['metadatas'][0][i].get('source', 'Unknown'),
-                    'relevance': 1 - results['distances'][0][i]  # Utiliser 'relevance' pour Streamlit
-                }
-                documents.append(doc)
+        for hit in hits:
+            # 1. Format the list of source documents
+            doc = {
+                'content': hit['document'],
+                'title': hit['metadata'].get('title', 'Unknown'),
+                'source': hit['metadata'].get('source', 'Unknown'),
+                'relevance': hit['similarity']  # Utiliser 'relevance' pour Streamlit
+            }
+            documents.append(doc)
         
         # 2. Combine all document contents into a single context string
         context_text = "\n\n---\n\n".join([doc['content'] for doc in documents])
@@ -129,21 +192,22 @@ class RAGPipeline:
                     "relevance": doc['relevance']
                 } for doc in documents
             ],
-            "type": "hybrid_rag"
+            "type": "hybrid_rag",
+            "category": categories[0] if categories else None
         }
     
-    def load_from_directory(self, directory_path: str):
+    def _load_directory_documents(self, directory_path: str) -> Optional[List[Dict]]:
         """
-        Charge tous les fichiers .txt d'un dossier
+        Lit et découpe tous les fichiers .txt/.md d'un dossier (None si le dossier n'existe pas)
         """
         if not os.path.exists(directory_path):
             print(f"❌ Directory not found: {directory_path}")
-            return
+            return None
         
         documents = []
         
-        # Parcourir tous les fichiers .txt
-        for filename in os.listdir(directory_path):
+        # Parcourir tous les fichiers .txt (ordre trié pour des positions stables)
+        for filename in sorted(os.listdir(directory_path)):
             if filename.endswith('.txt') or filename.endswith('.md'):
                 filepath = os.path.join(directory_path, filename)
                 
@@ -152,17 +216,75 @@ class RAGPipeline:
                 
                 # Découper en chunks si trop long
                 chunks = self._chunk_text(content, max_length=500)
+                category = detect_category(filename, content)
                 
                 for i, chunk in enumerate(chunks):
                     documents.append({
                         'content': chunk,
                         'title': f"{filename} (part {i+1})",
-                        'source': filename
+                        'source': filename,
+                        'category': category,
+                        'chunk_index': i
                     })
         
+        return documents
+    
+    def load_from_directory(self, directory_path: str):
+        """
+        Charge tous les fichiers .txt d'un dossier
+        """
+        documents = self._load_directory_documents(directory_path)
+        if documents is None:
+            return
+        
         print(f"📁 Found {len(documents)} chunks from {directory_path}")
         self.add_documents(documents)
     
+    def sync_directory(self, directory_path: str, batch_size: int = 100) -> Dict:
+        """
+        Synchronise la collection avec un dossier : n'embedde que les chunks
+        nouveaux ou modifiés et supprime ceux qui n'existent plus.
+        La collection devient le miroir exact du dossier.
+        
+        Returns:
+            Dict: {'added': int, 'deleted': int, 'unchanged': int}
+        """
+        documents = self._load_directory_documents(directory_path)
+        if documents is None:
+            return {'added': 0, 'deleted': 0, 'unchanged': 0}
+        
+        wanted = {}
+        for doc in documents:
+            wanted.setdefault(self._document_id(doc, doc['chunk_index']), doc)
+        
+        existing_records = self.collection.get(include=['metadatas'])
+        existing = set(existing_records['ids'])
+        # Chunks indexés avant le tag de catégorie : les ré-upserter (embeddings en cache)
+        untagged = {
+            doc_id for doc_id, metadata in zip(existing_records['ids'], existing_records['metadatas'])
+            if 'category' not in (metadata or {})
+        }
+        to_add = [doc for doc_id, doc in wanted.items() if doc_id not in existing or doc_id in untagged]
+        to_delete = [doc_id for doc_id in existing if doc_id not in wanted]
+        
+        print(f"📁 Sync {directory_path}: {len(to_add)} to add, "
+              f"{len(to_delete)} to delete, {len(wanted) - len(to_add)} unchanged")
+        
+        with collection_update(self.collection):
+            for start in range(0, len(to_delete), batch_size):
+                self.collection.delete(ids=to_delete[start:start + batch_size])
+        
+        if to_add:
+            self.add_documents(to_add, batch_size=batch_size)
+        elif to_delete:
+            self._refresh_dense_index()
+        
+        return {
+            'added': len(to_add),
+            'deleted': len(to_delete),
+            'unchanged': len(wanted) - len(to_add)
+        }
+    
     def _chunk_text(self, text: str, max_length: int = 500) -> List[str]:
         """
         Découpe un texte en chunks de taille raisonnable
@@ -181,8 +303,10 @@ class RAGPipeline:
         self.client.delete_collection(self.collection.name)
         self.collection = self.client.get_or_create_collection(
             name=self.collection.name,
-            metadata={"hnsw:space": "cosine"}
+            metadata=hnsw_metadata({"hnsw:space": "cosine"})
         )
+        mark_collection_updated(self.collection)
+        self._refresh_dense_index()
         print("🗑️ Collection cleared")
 
 
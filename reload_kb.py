@@ -2,12 +2,10 @@ from rag_pipeline import RAGPipeline
 
 print("🔄 Reloading knowledge base...")
 
-# Vider l'ancienne collection
 rag = RAGPipeline(collection_name="wiki_data")
-rag.clear_collection()
 
-# Recharger tous les fichiers
-rag.load_from_directory("wiki_data")
+# Synchroniser : seuls les chunks nouveaux/modifiés sont ré-embeddés
+rag.sync_directory("wiki_data")
 
 print(f"\n✅ Knowledge base reloaded!")
 print(f"📊 Total documents in KB: {rag.collection.count()}")
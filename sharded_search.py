@@ -0,0 +1,173 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+import numpy as np
+from bm25_index import BM25Index
+
+# État du processus worker : sa tranche de vecteurs et sa plage de chunks BM25
+_shard = {}
+
+
+def shard_bounds(count: int, n_shards: int) -> List[Tuple[int, int]]:
+    """Découpe [0, count) en n_shards tranches contiguës de tailles égales (à 1 près)"""
+    edges = np.linspace(0, count, n_shards + 1).astype(np.int64)
+    return [(int(edges[i]), int(edges[i + 1])) for i in range(n_shards)]
+
+
+def _init_shard(vectors_path: Optional[str], dim: int, dense_bounds: Tuple[int, int],
+                bm25_path: Optional[str], sparse_bounds: Tuple[int, int]):
+    """Initialiseur du worker : charge en mémoire sa tranche de l'index dense, ouvre l'index BM25"""
+    start, end = dense_bounds
+    _shard['dense_start'] = start
+    _shard['vectors'] = None
+    if vectors_path is not None and end > start:
+        _shard['vectors'] = np.array(np.memmap(vectors_path, dtype=np.float32, mode='r',
+                                               offset=start * dim * 4, shape=(end - start, dim)))
+    _shard['sparse_bounds'] = sparse_bounds
+    _shard['bm25'] = BM25Index(bm25_path) if bm25_path is not None else None
+
+
+def _top(scores: np.ndarray, k: int, offset: int):
+    """Top-k d'un tableau de scores, positions décalées de offset"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    rows = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    rows = rows[np.argsort(-scores[rows], kind='stable')]
+    return rows + offset, scores[rows]
+
+
+def _shard_dense(query: np.ndarray, k: int):
+    if _shard['vectors'] is None:
+        return _top(np.zeros(0, dtype=np.float32), k, 0)
+    return _top(_shard['vectors'] @ query, k, _shard['dense_start'])
+
+
+def _shard_sparse(query: str, k: int):
+    if _shard['bm25'] is None:
+        return _top(np.zeros(0, dtype=np.float32), k, 0)
+    # Seuls les postings de la plage du shard sont lus (recherche binaire par terme)
+    start, end = _shard['sparse_bounds']
+    return _shard['bm25'].top_k(query, k, start=start, end=end)
+
+
+def _ready():
+    """Tâche vide : force le démarrage du worker et le chargement de son shard"""
+    return True
+
+
+def _merge(parts, k: int):
+    """Fusionne les top-k de chaque shard en un top-k global"""
+    rows = np.concatenate([p[0] for p in parts])
+    scores = np.concatenate([p[1] for p in parts])
+    order = np.argsort(-scores, kind='stable')[:k]
+    return rows[order], scores[order]
+
+
+class ShardedRetriever:
+    """
+    Recherche scatter-gather sur n_shards processus
+    
+    Le corpus est découpé en tranches contiguës : chaque worker garde en
+    mémoire ses lignes de l'index dense (vectors.f32, donc déjà réduites
+    si l'index est en PCA) et score sa plage de chunks dans l'index BM25
+    (postings en memmap, partagés par le cache disque). Une requête
+    est envoyée à tous les workers, chacun renvoie son top-k exact et les
+    listes sont fusionnées : la latence suit le nombre de cœurs.
+    
+    Les workers sont lancés en 'spawn' (pas de fork d'un processus qui
+    tient des threads, des memmaps ou un client Chroma) et chargent leur
+    shard dès la construction : la première requête ne paie pas le
+    démarrage.
+    
+    Les workers font un parcours float32 exact ; les options du premier
+    étage (quantification, préfiltre binaire, IVF) et les filtres par
+    source / catégorie restent servis dans le processus principal.
+    """
+    
+    def __init__(self, dense_index=None, bm25=None, n_shards: int = None):
+        self.n_shards = n_shards or os.cpu_count() or 1
+        self.dense_index = dense_index
+        dense_count = len(dense_index) if dense_index is not None else 0
+        sparse_count = len(bm25) if bm25 is not None else 0
+        bm25_path = bm25.path if bm25 is not None else None
+        vectors_path = None
+        dim = 0
+        if dense_count:
+            vectors_path = os.path.join(dense_index.path, 'vectors.f32')
+            dim = dense_index.meta['dim']
+        
+        context = multiprocessing.get_context('spawn')
+        self.workers = []
+        for dense_bounds, sparse_bounds in zip(shard_bounds(dense_count, self.n_shards),
+                                               shard_bounds(sparse_count, self.n_shards)):
+            self.workers.append(ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=_init_shard,
+                initargs=(vectors_path, dim, dense_bounds, bm25_path, sparse_bounds)
+            ))
+        # Attendre que chaque worker ait chargé son shard
+        for future in [worker.submit(_ready) for worker in self.workers]:
+            future.result()
+    
+    def dense_top_k(self, query_embedding, top_k: int = 5):
+        """
+        Top-k dense sur tous les shards
+        
+        Returns:
+            (rows, scores) triés par score décroissant, rows dans l'index dense
+        """
+        query = self.dense_index.project(query_embedding)[0]
+        futures = [worker.submit(_shard_dense, query, top_k) for worker in self.workers]
+        return _merge([f.result() for f in futures], top_k)
+    
+    def sparse_top_k(self, query: str, top_k: int = 5):
+        """
+        Top-k BM25 sur tous les shards
+        
+        Returns:
+            (rows, scores) triés par score décroissant, rows dans le chunk store
+        """
+        futures = [worker.submit(_shard_sparse, query, top_k) for worker in self.workers]
+        return _merge([f.result() for f in futures], top_k)
+    
+    def close(self):
+        """Arrête les workers"""
+        for worker in self.workers:
+            worker.shutdown()
+        self.workers = []
+
+
+if __name__ == '__main__':
+    import argparse
+    from dense_index import NumpyDenseIndex, dense_index_path
+    
+    parser = argparse.ArgumentParser(description="Compare sharded and single-process dense search latency")
+    parser.add_argument('--collection', default='wiki')
+    parser.add_argument('--persist-directory', default='./chroma_data')
+    parser.add_argument('--shards', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--top-k', type=int, default=10)
+    args = parser.parse_args()
+    
+    index = NumpyDenseIndex(dense_index_path(args.collection, args.persist_directory))
+    # Requêtes aléatoires dans l'espace du modèle (projetées si l'index est réduit)
+    dim = index.meta['reduction']['source_dim'] if index.dims else index.meta['dim']
+    queries = np.random.RandomState(0).randn(args.queries, dim).astype(np.float32)
+    print(f"Corpus: {len(index)} vectors, {len(queries)} queries, top_k={args.top_k}\n")
+    
+    start = time.perf_counter()
+    exact = [index.top_k(q, args.top_k)[0] for q in queries]
+    print(f"{'single process':<16}{(time.perf_counter() - start) / len(queries) * 1000:>10.3f} ms")
+    
+    for n_shards in args.shards:
+        retriever = ShardedRetriever(index, n_shards=n_shards)
+        start = time.perf_counter()
+        sharded = [retriever.dense_top_k(q, args.top_k)[0] for q in queries]
+        latency = (time.perf_counter() - start) / len(queries) * 1000
+        same = np.mean([set(a.tolist()) == set(b.tolist()) for a, b in zip(exact, sharded)])
+        print(f"{f'{n_shards} shards':<16}{latency:>10.3f} ms  (same results: {same:.0%})")
+        retriever.close()
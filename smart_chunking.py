@@ -1,6 +1,7 @@
 import re
 import json
 from pathlib import Path
+from chunk_store import ChunkStore, write_chunks, CHUNKS_FILE, SMART_CHUNKS_FILE
 
 def smart_chunk_document(content: str, source: str) -> list:
     """
@@ -77,11 +78,10 @@ def reprocess_wiki_smart():
         })
     
     # Sauvegarder
-    with open(f'{output_dir}/chunks_smart.json', 'w', encoding='utf-8') as f:
-        json.dump(all_chunks, f, ensure_ascii=False, indent=2)
+    write_chunks(all_chunks, SMART_CHUNKS_FILE)
     
     print(f"\n✅ Smart chunking complete!")
-    print(f"Total chunks: {len(all_chunks)} (vs {len([c for c in json.load(open(f'{output_dir}/chunks.json', encoding='utf-8'))])} before)")
+    print(f"Total chunks: {len(all_chunks)} (vs {len(ChunkStore(CHUNKS_FILE))} before)")
     
     return all_chunks
 
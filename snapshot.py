@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tarfile
+from typing import Dict, Optional
+from chunk_store import ChunkStore, CHUNKS_FILE, index_path, keys_path, rebuild_index
+from dense_index import NumpyDenseIndex, dense_index_path, _publish
+from bm25_index import open_bm25, bm25_path
+from trigram_index import open_trigrams, trigram_path
+
+# Un snapshot est un dossier (ou une archive .tar de ce dossier) :
+#   chunks/                        chunk store (chunks.jsonl + .idx + .keys)
+#   dense/                         index dense NumPy (+ IVF / partitions)
+#   sparse/                        index BM25 (postings en memmap)
+#   trigrams/                      index de trigrammes (recherche exacte)
+#   manifest/                      manifest des embeddings, paramètres HNSW
+#   snapshot.json                  version du format, métadonnées, sha256 de chaque fichier
+SNAPSHOT_FORMAT = 3
+SNAPSHOT_DIR = './snapshots'
+SNAPSHOT_FILE = 'snapshot.json'
+MANIFEST_FILES = ('processed_wiki/embeddings_manifest.json', 'processed_wiki/hnsw_params.json')
+_HASH_BLOCK = 1 << 20
+
+
+def file_sha256(path: str) -> str:
+    """sha256 d'un fichier, lu par blocs"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _checksums(root: str) -> Dict[str, Dict]:
+    """{chemin relatif: {'sha256', 'size'}} de tous les fichiers du snapshot"""
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in sorted(names):
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            if relative == SNAPSHOT_FILE:
+                continue
+            files[relative] = {'sha256': file_sha256(path), 'size': os.path.getsize(path)}
+    return files
+
+
+def _check_name(name: str):
+    """Un nom de snapshot est un simple nom de dossier dans SNAPSHOT_DIR"""
+    if not name or '/' in name or '\\' in name or '..' in name or os.path.isabs(name):
+        raise ValueError(f"Invalid snapshot name {name!r}")
+
+
+def export_snapshot(name: Optional[str] = None, collection_name: str = 'wiki',
+                    persist_directory: str = './chroma_data', archive: bool = False) -> str:
+    """
+    Exporte chunk store, index dense, index BM25, index de trigrammes et
+    manifest dans un snapshot versionné
+    
+    L'index dense exporté de la collection est recopié tel quel (il doit
+    être à jour : python wiki_embedder.py) ; les partitions par source et
+    par catégorie sont construites avant la copie et les index BM25 et de
+    trigrammes sont mis à jour, pour que les replicas n'aient rien à recalculer.
+    
+    Returns:
+        Chemin du snapshot (dossier, ou archive .tar si archive)
+    """
+    name = name or time.strftime('wiki-%Y%m%d-%H%M%S')
+    _check_name(name)
+    path = os.path.join(SNAPSHOT_DIR, name)
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    
+    try:
+        # 1. Chunk store
+        print("1. Copying chunk store...")
+        os.makedirs(os.path.join(tmp_path, 'chunks'))
+        if os.path.exists(CHUNKS_FILE) and not os.path.exists(index_path(CHUNKS_FILE)):
+            print(f"   Rebuilding offset index of {CHUNKS_FILE}...")
+            rebuild_index(CHUNKS_FILE)
+        chunks = ChunkStore(CHUNKS_FILE)
+        chunk_count = len(chunks)
+        chunks.rows_of([])  # crée le fichier .keys s'il manque
+        chunks.close()
+        for source in (CHUNKS_FILE, index_path(CHUNKS_FILE), keys_path(CHUNKS_FILE)):
+            shutil.copy2(source, os.path.join(tmp_path, 'chunks', os.path.basename(source)))
+        
+        # 2. Index dense, partitions incluses
+        print("2. Copying dense index...")
+        dense_path = dense_index_path(collection_name, persist_directory)
+        if not os.path.exists(os.path.join(dense_path, 'meta.json')):
+            raise FileNotFoundError(f"No dense index in {dense_path}, run 'python wiki_embedder.py' first")
+        dense = NumpyDenseIndex(dense_path)
+        if len(dense):
+            dense.partition_index('source')
+            dense.partition_index('category')
+        dense_meta = dict(dense.meta)
+        dense.close()
+        shutil.copytree(dense_path, os.path.join(tmp_path, 'dense'))
+        
+        # 3. Index BM25, mis à jour si le chunk store a changé
+        print("3. Copying BM25 index...")
+        bm25 = open_bm25(CHUNKS_FILE)
+        bm25_meta = dict(bm25.meta)
+        bm25.close()
+        if bm25_meta['n_docs'] != chunk_count:
+            raise RuntimeError(f"{CHUNKS_FILE} changed during the export, retry")
+        shutil.copytree(bm25_path(CHUNKS_FILE), os.path.join(tmp_path, 'sparse'))
+        
+        # 4. Index de trigrammes, idem
+        print("4. Copying trigram index...")
+        trigrams = open_trigrams(CHUNKS_FILE)
+        trigram_docs = len(trigrams)
+        trigrams.close()
+        if trigram_docs != chunk_count:
+            raise RuntimeError(f"{CHUNKS_FILE} changed during the export, retry")
+        shutil.copytree(trigram_path(CHUNKS_FILE), os.path.join(tmp_path, 'trigrams'))
+        
+        # 5. Manifest
+        print("5. Copying manifest...")
+        os.makedirs(os.path.join(tmp_path, 'manifest'))
+        for source in MANIFEST_FILES:
+            if os.path.exists(source):
+                shutil.copy2(source, os.path.join(tmp_path, 'manifest', os.path.basename(source)))
+        
+        # 6. Sommes de contrôle, snapshot.json en dernier
+        print("6. Computing checksums...")
+        files = _checksums(tmp_path)
+        with open(os.path.join(tmp_path, SNAPSHOT_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                'format': SNAPSHOT_FORMAT,
+                'name': name,
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'collection': collection_name,
+                'model': dense_meta.get('model'),
+                'chunks': chunk_count,
+                'vectors': dense_meta['count'],
+                'dim': dense_meta['dim'],
+                'precision': dense_meta.get('precision', 'float32'),
+                'reduction': dense_meta.get('reduction'),
+                'bm25_terms': bm25_meta['n_terms'],
+                'files': files
+            }, f, indent=2)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    
+    _publish(tmp_path, path)
+    if not archive:
+        return path
+    
+    archive_path = path + '.tar'
+    with tarfile.open(archive_path + '.tmp', 'w') as tar:
+        tar.add(path, arcname=name)
+    os.replace(archive_path + '.tmp', archive_path)
+    shutil.rmtree(path)
+    return archive_path
+
+
+def read_snapshot(path: str) -> Dict:
+    """Métadonnées d'un snapshot (snapshot.json), format vérifié"""
+    with open(os.path.join(path, SNAPSHOT_FILE), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f"Snapshot {path} has format {meta.get('format')}, "
+                         f"expected {SNAPSHOT_FORMAT}")
+    return meta
+
+
+def verify_snapshot(path: str) -> Dict:
+    """
+    Vérifie taille et sha256 de chaque fichier listé dans snapshot.json
+    
+    Raises:
+        ValueError si un fichier manque ou ne correspond pas
+    """
+    meta = read_snapshot(path)
+    for relative, expected in meta['files'].items():
+        file_path = os.path.join(path, *relative.split('/'))
+        if not os.path.exists(file_path):
+            raise ValueError(f"Snapshot {path} is missing {relative}")
+        if os.path.getsize(file_path) != expected['size'] or \
+                file_sha256(file_path) != expected['sha256']:
+            raise ValueError(f"Snapshot {path} is corrupted: checksum mismatch for {relative}")
+    return meta
+
+
+def import_snapshot(source: str) -> str:
+    """
+    Installe un snapshot (archive .tar ou dossier) dans SNAPSHOT_DIR après
+    vérification des sommes de contrôle
+    
+    Returns:
+        Chemin du dossier à passer à HybridWikiRAG(snapshot=...)
+    """
+    if os.path.isdir(source):
+        verify_snapshot(source)
+        return source
+    
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp_path = os.path.join(SNAPSHOT_DIR, '.import.tmp')
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    try:
+        with tarfile.open(source, 'r') as tar:
+            members = tar.getmembers()
+            for member in members:
+                # Pas de chemins absolus, de '..' ni de liens dans une archive de snapshot
+                if not (member.isfile() or member.isdir()) or os.path.isabs(member.name) or \
+                        '..' in member.name.replace('\\', '/').split('/'):
+                    raise ValueError(f"Unsafe entry in snapshot archive: {member.name}")
+            tar.extractall(tmp_path, members=members)
+        names = os.listdir(tmp_path)
+        if len(names) != 1:
+            raise ValueError(f"Snapshot archive {source} must contain a single directory")
+        _check_name(names[0])
+        verify_snapshot(os.path.join(tmp_path, names[0]))
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    
+    # Dossier installé nommé d'après l'entrée de l'archive (déjà vérifiée),
+    # jamais d'après le champ 'name' de snapshot.json
+    path = os.path.join(SNAPSHOT_DIR, names[0])
+    _publish(os.path.join(tmp_path, names[0]), path)
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+
+def snapshot_paths(path: str) -> Dict[str, str]:
+    """Chemins des composants d'un snapshot ouvert par HybridWikiRAG"""
+    read_snapshot(path)
+    return {
+        'chunks': os.path.join(path, 'chunks', os.path.basename(CHUNKS_FILE)),
+        'dense': os.path.join(path, 'dense'),
+        'sparse': os.path.join(path, 'sparse'),
+        'trigrams': os.path.join(path, 'trigrams')
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Export, import or verify a wiki index snapshot")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help="Bundle the current indexes into a snapshot")
+    export_parser.add_argument('--name', default=None, help="Snapshot name (default: timestamp)")
+    export_parser.add_argument('--collection', default='wiki')
+    export_parser.add_argument('--persist-directory', default='./chroma_data')
+    export_parser.add_argument('--archive', action='store_true',
+                               help="Write a single .tar file instead of a directory")
+    import_parser = commands.add_parser('import', help="Verify and install a snapshot")
+    import_parser.add_argument('source', help="Snapshot .tar archive or directory")
+    verify_parser = commands.add_parser('verify', help="Check a snapshot's checksums")
+    verify_parser.add_argument('path')
+    args = parser.parse_args()
+    
+    start = time.time()
+    if args.command == 'export':
+        path = export_snapshot(args.name, args.collection, args.persist_directory, args.archive)
+        print(f"✅ Snapshot exported to {path} in {time.time() - start:.1f}s")
+    elif args.command == 'import':
+        path = import_snapshot(args.source)
+        print(f"✅ Snapshot verified and installed in {path} ({time.time() - start:.1f}s)")
+        print(f"   Open it with HybridWikiRAG(snapshot='{path}')")
+    else:
+        meta = verify_snapshot(args.path)
+        print(f"✅ Snapshot {meta['name']} OK: {len(meta['files'])} files, "
+              f"{meta['chunks']} chunks, {meta['vectors']} vectors")
@@ -0,0 +1,256 @@
+import os
+import re
+import json
+import time
+import shutil
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from chunk_store import ChunkStore, CHUNKS_FILE
+from dense_index import _publish
+from bm25_index import _source_state
+
+# Index de trigrammes sur le texte des chunks (octets UTF-8 en minuscules),
+# à côté du chunk store (ligne i = chunk i) :
+#   trigram_keys.u32     trigrammes présents, triés (3 octets empaquetés)
+#   trigram_offsets.u64  bornes des postings de chaque trigramme
+#   postings_docs.u32    chunks contenant le trigramme, croissants
+#   trigrams.json        état du chunk store indexé
+TRIGRAM_DIR_NAME = 'trigrams'
+TRIGRAM_VERSION = 1
+
+# Termes "code" d'une requête : phrases entre guillemets / backticks, et
+# tokens avec _, ::, hôte:port, chemin (/x ou a/b/), nom.extension,
+# camelCase ou lettre suivie d'un chiffre (E1001, utf8). La prose
+# (e-mail, step-by-step, and/or, 2024, 3rd) n'en fait pas partie.
+_QUOTED = re.compile(r'"([^"]{3,})"|`([^`]{3,})`')
+_TOKEN = re.compile(r'[A-Za-z0-9_/][A-Za-z0-9_.:/\-]*[A-Za-z0-9_]')
+_CODE_LIKE = re.compile(r'_|::|[A-Za-z0-9]:\d{2,}|^/\w|\w/\w+/|\w{2,}\.\w{2,}|[a-z][A-Z]|[A-Za-z]\d')
+# Syntaxe regex qui rend un littéral optionnel ou alternatif
+_REGEX_UNSAFE = re.compile(r'[|()]')
+_REGEX_SPLIT = re.compile(r'\[(?:\\.|[^\]])*\]|\\.|.[?*]|.\{[^}]*\}|[.^$+{}]')
+
+
+def trigram_path(chunks_path: str = CHUNKS_FILE) -> str:
+    """Dossier de l'index de trigrammes d'un chunk store"""
+    return os.path.join(os.path.dirname(chunks_path), TRIGRAM_DIR_NAME)
+
+
+def trigrams(text: str) -> np.ndarray:
+    """Trigrammes distincts (triés) du texte en minuscules, 3 octets UTF-8 par uint32"""
+    data = np.frombuffer(text.lower().encode('utf-8'), dtype=np.uint8).astype(np.uint32)
+    if len(data) < 3:
+        return np.zeros(0, dtype=np.uint32)
+    return np.unique((data[:-2] << 16) | (data[1:-1] << 8) | data[2:])
+
+
+def code_terms(query: str) -> List[str]:
+    """Phrases entre guillemets et identifiants / clés / ports / codes d'erreur de la requête"""
+    terms = [a or b for a, b in _QUOTED.findall(query)]
+    unquoted = _QUOTED.sub(' ', query)
+    for token in _TOKEN.findall(unquoted):
+        if len(token) >= 3 and _CODE_LIKE.search(token) and token not in terms:
+            terms.append(token)
+    return terms
+
+
+def regex_literals(pattern: str) -> List[str]:
+    """
+    Littéraux (3+ caractères) qu'une correspondance de pattern contient
+    forcément ; vide si le pattern a des groupes ou des alternatives
+    """
+    if _REGEX_UNSAFE.search(pattern):
+        return []
+    return [piece for piece in _REGEX_SPLIT.split(pattern) if len(piece) >= 3]
+
+
+def trigram_is_current(chunks_path: str = CHUNKS_FILE, path: Optional[str] = None) -> bool:
+    """Index de trigrammes construit sur l'état actuel du chunk store"""
+    meta_path = os.path.join(path or trigram_path(chunks_path), 'trigrams.json')
+    if not os.path.exists(meta_path) or not os.path.exists(chunks_path):
+        return False
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    return meta.get('version') == TRIGRAM_VERSION and meta.get('source') == _source_state(chunks_path)
+
+
+def build_trigrams(chunks_path: str = CHUNKS_FILE, path: Optional[str] = None) -> Dict:
+    """
+    Construit l'index de trigrammes d'un chunk store
+    
+    Les trigrammes de chaque chunk sont extraits en NumPy (un décalage
+    d'octets), puis les couples (trigramme, chunk) sont triés en une fois.
+    
+    Returns:
+        Statistiques : chunks, trigrammes distincts, postings, durée
+    """
+    path = path or trigram_path(chunks_path)
+    start = time.time()
+    source = _source_state(chunks_path)
+    
+    doc_trigrams = []
+    chunks = ChunkStore(chunks_path)
+    for content in chunks.iter_field('content'):
+        doc_trigrams.append(trigrams(content))
+    chunks.close()
+    
+    n_docs = len(doc_trigrams)
+    lengths = np.array([len(t) for t in doc_trigrams], dtype=np.int64)
+    keys = np.concatenate(doc_trigrams) if n_docs else np.zeros(0, dtype=np.uint32)
+    docs = np.repeat(np.arange(n_docs, dtype=np.uint32), lengths)
+    order = np.lexsort((docs, keys))
+    keys, docs = keys[order], docs[order]
+    unique_keys, starts = np.unique(keys, return_index=True)
+    offsets = np.append(starts, len(keys)).astype(np.uint64)
+    
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    try:
+        unique_keys.astype(np.uint32).tofile(os.path.join(tmp_path, 'trigram_keys.u32'))
+        offsets.tofile(os.path.join(tmp_path, 'trigram_offsets.u64'))
+        docs.tofile(os.path.join(tmp_path, 'postings_docs.u32'))
+        stats = {
+            'version': TRIGRAM_VERSION,
+            'n_docs': n_docs,
+            'n_trigrams': int(len(unique_keys)),
+            'n_postings': int(len(docs)),
+            'source': source
+        }
+        with open(os.path.join(tmp_path, 'trigrams.json'), 'w', encoding='utf-8') as f:
+            json.dump(stats, f)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    _publish(tmp_path, path)
+    
+    return {
+        'docs': n_docs,
+        'trigrams': stats['n_trigrams'],
+        'postings': stats['n_postings'],
+        'build_seconds': round(time.time() - start, 2)
+    }
+
+
+def open_trigrams(chunks_path: str = CHUNKS_FILE) -> 'TrigramIndex':
+    """Ouvre l'index de trigrammes d'un chunk store, reconstruit au préalable s'il est périmé"""
+    if not trigram_is_current(chunks_path):
+        stats = build_trigrams(chunks_path)
+        print(f"   ✅ Trigram index built: {stats['trigrams']} trigrams over "
+              f"{stats['docs']} chunks in {stats['build_seconds']}s")
+    return TrigramIndex(trigram_path(chunks_path), chunks_path)
+
+
+def _contains(sorted_values: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Masque des values présentes dans sorted_values (recherche binaire)"""
+    if not len(sorted_values):
+        return np.zeros(len(values), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return sorted_values[positions] == values
+
+
+class TrigramIndex:
+    """
+    Recherche de sous-chaînes exactes / regex par index de trigrammes
+    
+    Les chunks candidats sont l'intersection des listes des trigrammes du
+    littéral (de la plus courte à la plus longue) ; seuls ces candidats
+    sont lus et tous sont vérifiés avant le classement. Les
+    correspondances sont insensibles à la casse et classées par nombre
+    d'occurrences.
+    """
+    
+    def __init__(self, path: str, chunks_path: str = CHUNKS_FILE):
+        self.path = path
+        with open(os.path.join(path, 'trigrams.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.keys = np.fromfile(os.path.join(path, 'trigram_keys.u32'), dtype=np.uint32)
+        self.offsets = np.fromfile(os.path.join(path, 'trigram_offsets.u64'),
+                                   dtype=np.uint64).astype(np.int64)
+        n_postings = self.meta['n_postings']
+        self.docs = np.memmap(os.path.join(path, 'postings_docs.u32'), dtype=np.uint32,
+                              mode='r', shape=(n_postings,)) if n_postings else np.zeros(0, np.uint32)
+        self.chunks = ChunkStore(chunks_path)
+    
+    def __len__(self) -> int:
+        return self.meta['n_docs']
+    
+    def candidates(self, literals: List[str], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Chunks contenant tous les trigrammes de chacun des littéraux (triés)"""
+        wanted = np.unique(np.concatenate([trigrams(literal) for literal in literals]))
+        positions = np.searchsorted(self.keys, wanted)
+        if not len(wanted) or np.any(positions >= len(self.keys)) or \
+                np.any(self.keys[np.minimum(positions, len(self.keys) - 1)] != wanted):
+            return np.zeros(0, dtype=np.int64)
+        
+        spans = sorted(((self.offsets[p], self.offsets[p + 1]) for p in positions),
+                       key=lambda span: span[1] - span[0])
+        result = np.asarray(self.docs[spans[0][0]:spans[0][1]], dtype=np.int64)
+        if rows is not None:
+            result = result[_contains(np.asarray(rows, dtype=np.int64), result)]
+        for a, z in spans[1:]:
+            if not len(result):
+                break
+            result = result[_contains(self.docs[a:z], result)]
+        return result
+    
+    def search(self, pattern: str, top_k: int = 5, regex: bool = False,
+               rows: Optional[np.ndarray] = None) -> List[Tuple[int, int]]:
+        """
+        Chunks qui contiennent pattern (littéral, ou regex si regex=True),
+        parmi rows si donné
+        
+        Returns:
+            [(ligne du chunk, nombre d'occurrences)] par occurrences décroissantes
+        
+        Raises:
+            ValueError si le pattern n'a aucun littéral indexable (3+ caractères)
+        """
+        if regex:
+            literals = regex_literals(pattern)
+            matcher = re.compile(pattern, re.IGNORECASE)
+            count = lambda content: len(matcher.findall(content))
+        else:
+            literals = [pattern] if len(pattern) >= 3 else []
+            needle = pattern.lower()
+            count = lambda content: content.lower().count(needle)
+        if not literals:
+            raise ValueError(f"Pattern {pattern!r} has no literal of 3+ characters to look up")
+        
+        matches = []
+        for row in self.candidates(literals, rows):
+            occurrences = count(self.chunks[int(row)]['content'])
+            if occurrences:
+                matches.append((int(row), occurrences))
+        matches.sort(key=lambda match: -match[1])
+        return matches[:top_k]
+    
+    def close(self):
+        """Libère les fichiers mappés"""
+        self.docs = None
+        self.chunks.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Build the trigram index or look up a substring / regex")
+    parser.add_argument('pattern', nargs='?', help="Substring (or regex with --regex) to look up")
+    parser.add_argument('--chunks', default=CHUNKS_FILE)
+    parser.add_argument('--regex', action='store_true')
+    parser.add_argument('--top-k', type=int, default=10)
+    args = parser.parse_args()
+    
+    if args.pattern is None:
+        stats = build_trigrams(args.chunks)
+        print(f"✅ Trigram index: {stats['trigrams']} trigrams, {stats['postings']} postings "
+              f"over {stats['docs']} chunks in {stats['build_seconds']}s")
+    else:
+        index = open_trigrams(args.chunks)
+        start = time.perf_counter()
+        matches = index.search(args.pattern, args.top_k, regex=args.regex)
+        elapsed = (time.perf_counter() - start) * 1000
+        for row, occurrences in matches:
+            chunk = index.chunks[row]
+            print(f"  {chunk['source']} :: {chunk['title']} ({occurrences}x)")
+        print(f"✅ {len(matches)} chunks in {elapsed:.3f} ms")
@@ -0,0 +1,161 @@
+import os
+import json
+import shutil
+import time
+import itertools
+import numpy as np
+import hnswlib
+import chromadb
+from sentence_transformers import SentenceTransformer
+from dense_index import (open_dense_index, dense_index_path, export_collection,
+                         NumpyDenseIndex, normalize)
+from evaluate_rag import test_cases
+from ingest import HNSW_PARAMS_FILE
+
+CHROMA_DIR = "./chroma_data"
+COLLECTION_NAME = "wiki"
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+# Grille balayée (valeurs par défaut de Chroma : M=16, construction_ef=100, search_ef=10)
+M_VALUES = (8, 16, 32, 48)
+CONSTRUCTION_EF_VALUES = (64, 100, 200, 400)
+SEARCH_EF_VALUES = (10, 20, 40, 80, 160)
+
+
+def synthetic_queries(vectors: np.ndarray, n: int = 200, noise: float = 0.025,
+                      seed: int = 0) -> np.ndarray:
+    """Requêtes synthétiques : chunks tirés au hasard + bruit gaussien (cosinus ~0.9)"""
+    rng = np.random.RandomState(seed)
+    rows = rng.choice(len(vectors), min(n, len(vectors)), replace=False)
+    base = np.asarray(vectors[np.sort(rows)], dtype=np.float32)
+    return normalize(base + rng.normal(0, noise, base.shape).astype(np.float32))
+
+
+def measure(index, queries: np.ndarray, exact_rows, top_k: int) -> dict:
+    """Recall@k contre la recherche exacte et latences p50/p95 (une requête à la fois)"""
+    latencies = []
+    recalls = []
+    for query, exact in zip(queries, exact_rows):
+        start = time.perf_counter()
+        labels, _ = index.knn_query(query, k=top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(set(labels[0].tolist()) & set(exact)) / len(exact))
+    return {
+        'recall_at_k': round(float(np.mean(recalls)), 4),
+        'p50_latency_ms': round(float(np.percentile(latencies, 50)), 4),
+        'p95_latency_ms': round(float(np.percentile(latencies, 95)), 4)
+    }
+
+
+def tune_hnsw(top_k: int = 10, target_recall: float = 0.98, n_synthetic: int = 200,
+              write: bool = True) -> dict:
+    """
+    Balaye M / construction_ef / search_ef et retient la configuration la
+    plus rapide (p95) qui atteint target_recall sur toutes les requêtes
+    
+    Les index HNSW sont construits avec hnswlib (le moteur de Chroma) sur
+    les embeddings complets de la collection (ceux que Chroma indexe,
+    même si l'index dense servi est réduit par PCA) ; la vérité terrain
+    est la recherche exacte NumPy sur ces mêmes vecteurs. Les paramètres retenus sont écrits dans
+    HNSW_PARAMS_FILE, lu par les scripts qui (re)créent les collections.
+    """
+    print("="*70)
+    print("HNSW PARAMETER TUNING")
+    print("="*70)
+    
+    client = chromadb.PersistentClient(path=CHROMA_DIR)
+    collection = client.get_collection(COLLECTION_NAME)
+    space = (collection.metadata or {}).get('hnsw:space', 'l2')
+    path = dense_index_path(COLLECTION_NAME, CHROMA_DIR)
+    exact = open_dense_index('numpy', collection, path, model_name=MODEL_NAME)
+    full_path = None
+    if exact.dims:
+        # Index servi réduit par PCA : export temporaire en dimension complète
+        exact.close()
+        full_path = f"{path}_full"
+        print(f"Dense index is PCA-reduced, exporting full-dimension vectors to {full_path}...")
+        export_collection(collection, full_path, MODEL_NAME)
+        exact = NumpyDenseIndex(full_path)
+    vectors = np.array(exact.vectors)
+    if not len(vectors):
+        print("❌ Collection is empty, nothing to tune")
+        return {}
+    
+    print(f"Loading embedding model: {MODEL_NAME}")
+    model = SentenceTransformer(MODEL_NAME)
+    eval_queries = exact.project(model.encode([test['query'] for test in test_cases], convert_to_numpy=True))
+    queries = np.vstack([eval_queries, synthetic_queries(vectors, n_synthetic)])
+    top_k = min(top_k, len(vectors))
+    exact_rows = [exact.top_k(query, top_k)[0].tolist() for query in queries]
+    if full_path:
+        exact.close()
+        shutil.rmtree(full_path, ignore_errors=True)
+    print(f"Corpus: {len(vectors)} vectors ({space}), {len(eval_queries)} eval + "
+          f"{len(queries) - len(eval_queries)} synthetic queries, top_k={top_k}\n")
+    
+    results = []
+    print(f"{'M':>4}{'ef_c':>6}{'ef_s':>6}{'Build s':>9}{'Recall':>9}{'P50 ms':>9}{'P95 ms':>9}")
+    print("-"*52)
+    for m, construction_ef in itertools.product(M_VALUES, CONSTRUCTION_EF_VALUES):
+        start = time.time()
+        index = hnswlib.Index(space=space, dim=vectors.shape[1])
+        index.init_index(max_elements=len(vectors), M=m, ef_construction=construction_ef,
+                         random_seed=100)
+        index.add_items(vectors, np.arange(len(vectors)))
+        build_seconds = time.time() - start
+        
+        for search_ef in SEARCH_EF_VALUES:
+            index.set_ef(max(search_ef, top_k))
+            metrics = measure(index, queries, exact_rows, top_k)
+            results.append({
+                'params': {'M': m, 'construction_ef': construction_ef, 'search_ef': search_ef},
+                'build_seconds': round(build_seconds, 2),
+                **metrics
+            })
+            print(f"{m:>4}{construction_ef:>6}{search_ef:>6}{build_seconds:>9.2f}"
+                  f"{metrics['recall_at_k']:>9.3f}{metrics['p50_latency_ms']:>9.3f}"
+                  f"{metrics['p95_latency_ms']:>9.3f}")
+    
+    # La plus rapide au-dessus de la cible, sinon le meilleur recall
+    passing = [r for r in results if r['recall_at_k'] >= target_recall]
+    if passing:
+        best = min(passing, key=lambda r: (r['p95_latency_ms'], r['build_seconds']))
+    else:
+        print(f"\n⚠️  No configuration reaches recall {target_recall}, keeping the best recall")
+        best = max(results, key=lambda r: (r['recall_at_k'], -r['p95_latency_ms']))
+    
+    print(f"\n✅ Selected: {best['params']} (recall {best['recall_at_k']:.3f}, "
+          f"p95 {best['p95_latency_ms']:.3f} ms)")
+    
+    report = {
+        'params': best['params'],
+        'metrics': {k: v for k, v in best.items() if k != 'params'},
+        'target_recall': target_recall,
+        'top_k': top_k,
+        'corpus_size': len(vectors),
+        'space': space,
+        'sweep': results
+    }
+    if write:
+        os.makedirs(os.path.dirname(HNSW_PARAMS_FILE), exist_ok=True)
+        with open(HNSW_PARAMS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"   Saved to {HNSW_PARAMS_FILE}, applied on the next collection rebuild")
+        print("   (python wiki_embedder.py, python index_wiki.py, RAGPipeline.clear_collection)")
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Sweep HNSW parameters against exact search and save the best")
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--target-recall', type=float, default=0.98)
+    parser.add_argument('--synthetic', type=int, default=200,
+                        help="Number of synthetic queries added to the evaluate_rag.py ones")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Report only, do not write the selected parameters")
+    args = parser.parse_args()
+    
+    tune_hnsw(top_k=args.top_k, target_recall=args.target_recall,
+              n_synthetic=args.synthetic, write=not args.dry_run)
@@ -1,8 +1,7 @@
-import json
+from chunk_store import ChunkStore, CHUNKS_FILE
 
-# Charger chunks
-with open('processed_wiki/chunks.json', 'r') as f:
-    chunks = json.load(f)
+# Ouvrir le chunk store (lecture paresseuse)
+chunks = ChunkStore(CHUNKS_FILE)
 
 print("="*60)
 print("CHUNK QUALITY ANALYSIS")
@@ -1,92 +1,276 @@
+import os
 import json
+import hashlib
 import chromadb
 from sentence_transformers import SentenceTransformer
 from pathlib import Path
+from chunk_store import ChunkStore, CHUNKS_FILE, chunk_key
+from embedding_batcher import EmbeddingBatcher
+from embedding_cache import EmbeddingCache
+from dense_index import (export_collection, dense_index_path,
+                         DENSE_PRECISIONS, DEFAULT_DENSE_PRECISION)
+from ivf_index import build_ivf
+from ingest import (pipelined_ingest, print_ingest_summary, verify_collection,
+                    IngestCheckpoint, job_fingerprint, hnsw_metadata, DEFAULT_BATCH_SIZE,
+                    collection_update, mark_collection_updated)
 
-def create_wiki_embeddings():
-    """Créer les embeddings et la collection ChromaDB"""
+MANIFEST_FILE = 'processed_wiki/embeddings_manifest.json'
+CHECKPOINT_FILE = 'processed_wiki/embeddings_checkpoint.json'
+COLLECTION_NAME = 'wiki'
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+def chunk_hash(chunk: dict) -> str:
+    """Hash du contenu et des métadonnées indexées d'un chunk"""
+    h = hashlib.sha256()
+    for field in ('content', 'title', 'category'):
+        h.update(str(chunk.get(field, '')).encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+def load_manifest() -> dict:
+    """Charge le manifest des chunks déjà embeddés (vide si absent)"""
+    if not os.path.exists(MANIFEST_FILE):
+        return {}
+    with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(manifest: dict):
+    """Sauvegarde le manifest de façon atomique"""
+    tmp_file = MANIFEST_FILE + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_file, MANIFEST_FILE)
+
+def create_wiki_embeddings(incremental: bool = False, batch_size: int = DEFAULT_BATCH_SIZE,
+                           dense_precision: str = DEFAULT_DENSE_PRECISION,
+                           ivf_lists: int = 0, dense_dims: int = 0):
+    """
+    Créer les embeddings et la collection ChromaDB
+    
+    Args:
+        incremental: Si True, n'embedde que les chunks nouveaux ou modifiés
+                     (d'après le manifest des hashes) et supprime les chunks
+                     disparus, au lieu de reconstruire toute la collection
+        batch_size: Nombre de chunks par écriture Chroma
+        dense_precision: Stockage de l'index dense NumPy ('float32',
+                         'float16' ou 'int8' avec rescoring float32)
+        ivf_lists: Partitions k-means de l'index IVF (0 : pas d'IVF,
+                   -1 : nombre par défaut ~4*sqrt(n))
+        dense_dims: Dimension des vecteurs de l'index dense après PCA
+                    (0 : dimension complète du modèle)
+    """
     
     print("="*70)
-    print("WIKI EMBEDDINGS CREATOR")
+    print("WIKI EMBEDDINGS CREATOR" + (" (incremental)" if incremental else ""))
     print("="*70)
     
     # 1. Charger les chunks
     print("\n1. Loading processed chunks...")
-    with open('processed_wiki/chunks.json', 'r', encoding='utf-8') as f:
-        chunks = json.load(f)
-    print(f"   ✅ Loaded {len(chunks)} chunks")
+    store = ChunkStore(CHUNKS_FILE)
+    print(f"   ✅ Found {len(store)} chunks")
+    
+    # Une seule passe en streaming : on ne garde que les chunks à ré-embedder
+    current = {}
+    skipped_duplicates = 0
+    for chunk in store:
+        # Quasi-doublons marqués par wiki_processor --dedup mark : pas d'embedding
+        if chunk.get('duplicate_of'):
+            skipped_duplicates += 1
+            continue
+        current[chunk_key(chunk)] = {
+            'hash': chunk_hash(chunk),
+            'source': chunk['source']
+        }
+    if skipped_duplicates:
+        print(f"   ✅ Skipping {skipped_duplicates} near-duplicate chunks")
     
     # 2. Initialiser le modèle d'embedding
     print("\n2. Loading embedding model...")
-    model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+    model = SentenceTransformer(MODEL_NAME)
+    cache = EmbeddingCache(MODEL_NAME)
+    batcher = EmbeddingBatcher(model, cache=cache)
     print("   ✅ Model loaded")
     
     # 3. Créer ChromaDB client (nouvelle API)
     print("\n3. Initializing ChromaDB...")
     client = chromadb.PersistentClient(path="./chroma_data")
     
-    # Supprimer collection existante si elle existe
-    try:
-        client.delete_collection("wiki")
-        print("   ⚠️  Deleted existing collection")
-    except:
-        pass
-    
-    # Créer nouvelle collection
-    collection = client.create_collection(
-        name="wiki",
-        metadata={"description": "Wiki documentation embeddings"}
+    # Un checkpoint présent = run précédent interrompu : reprendre dans le même mode
+    checkpoint = IngestCheckpoint(CHECKPOINT_FILE)
+    resuming = checkpoint.data is not None
+    if resuming:
+        print(f"   ⚠️  Interrupted run found: {checkpoint.data['committed_batches']}/"
+              f"{checkpoint.data['total_batches']} batches committed")
+        incremental = checkpoint.data.get('incremental', False)
+    
+    manifest = load_manifest() if incremental else {}
+    previous = manifest.get('chunks', {})
+    
+    if incremental and manifest.get('model') != MODEL_NAME:
+        print("   ⚠️  No usable manifest for this model, falling back to full rebuild")
+        incremental = False
+        previous = {}
+    
+    collection = client.get_or_create_collection(
+        name=COLLECTION_NAME,
+        metadata=hnsw_metadata({"description": "Wiki documentation embeddings"})
     )
-    print("   ✅ Collection created")
     
-    # 4. Générer embeddings et ajouter à ChromaDB
-    print("\n4. Generating embeddings and adding to ChromaDB...")
+    # Le manifest ne décrit plus la collection (supprimée ou modifiée à la main).
+    # Pendant une reprise le décalage est normal : le manifest n'est écrit qu'à la fin
+    if incremental and not resuming and collection.count() != len(previous):
+        print(f"   ⚠️  Collection has {collection.count()} documents but manifest "
+              f"lists {len(previous)}, falling back to full rebuild")
+        incremental = False
+        previous = {}
     
-    batch_size = 10
-    for i in range(0, len(chunks), batch_size):
-        batch = chunks[i:i+batch_size]
-        
-        # Extraire contenus
-        contents = [chunk['content'] for chunk in batch]
-        
-        # Générer embeddings
-        embeddings = model.encode(contents, show_progress_bar=False)
-        
-        # Préparer données pour ChromaDB
-        ids = [f"doc_{i+j}" for j in range(len(batch))]
-        metadatas = [
-            {
-                'source': chunk['source'],
-                'title': chunk['title'],
-                'category': chunk['category'],
-                'chunk_id': chunk['chunk_id']
-            }
-            for chunk in batch
+    # 4. Calculer le diff avec le manifest
+    def plan(previous):
+        to_embed = [
+            chunk for chunk in store
+            if chunk_key(chunk) in current
+            and previous.get(chunk_key(chunk), {}).get('hash') != current[chunk_key(chunk)]['hash']
+        ]
+        to_delete = [key for key in previous if key not in current]
+        records = [
+            (
+                chunk_key(chunk),
+                chunk['content'],
+                {
+                    'source': chunk['source'],
+                    'title': chunk['title'],
+                    'category': chunk['category'],
+                    'chunk_id': chunk['chunk_id']
+                }
+            )
+            for chunk in to_embed
         ]
+        return to_delete, records
+    
+    to_delete, records = plan(previous)
+    fingerprint = job_fingerprint(records, batch_size)
+    
+    if resuming and checkpoint.data.get('fingerprint') != fingerprint:
+        print("   ⚠️  Chunks changed since the interrupted run, starting a full rebuild")
+        resuming = False
+        incremental = False
+        previous = {}
+        to_delete, records = plan(previous)
+        fingerprint = job_fingerprint(records, batch_size)
+    
+    if not incremental and not resuming:
+        # Supprimer collection existante si elle existe
+        try:
+            client.delete_collection(COLLECTION_NAME)
+            print("   ⚠️  Deleted existing collection")
+        except:
+            pass
         
-        # Ajouter à collection
-        collection.add(
-            ids=ids,
-            embeddings=embeddings.tolist(),
-            documents=contents,
-            metadatas=metadatas
+        # Créer nouvelle collection
+        collection = client.create_collection(
+            name=COLLECTION_NAME,
+            metadata=hnsw_metadata({"description": "Wiki documentation embeddings"})
         )
-        
-        print(f"   ✅ Processed batch {i//batch_size + 1}/{(len(chunks)-1)//batch_size + 1}")
+        mark_collection_updated(collection)
+        print("   ✅ Collection created")
+    else:
+        print(f"   ✅ Using existing collection ({collection.count()} documents)")
+    
+    total_batches = (len(records) + batch_size - 1) // batch_size
+    committed = checkpoint.start(fingerprint, total_batches, incremental=incremental)
+    
+    if incremental:
+        removed_sources = sorted({previous[key]['source'] for key in to_delete} -
+                                 {info['source'] for info in current.values()})
+        print(f"\n4. Diff against manifest:")
+        print(f"   New or changed chunks: {len(records)}")
+        print(f"   Stale chunks to delete: {len(to_delete)}")
+        print(f"   Unchanged chunks: {len(current) - len(records)}")
+        for source in removed_sources:
+            print(f"      - removed source: {source}")
+    
+    # 5. Supprimer les chunks disparus (idempotent, rejoué sans risque à la reprise)
+    if to_delete:
+        print("\n5. Deleting stale chunks...")
+        with collection_update(collection):
+            for i in range(0, len(to_delete), batch_size):
+                collection.delete(ids=to_delete[i:i + batch_size])
+        print(f"   ✅ Deleted {len(to_delete)} chunks")
+    
+    # 6. Générer embeddings et ajouter à ChromaDB
+    print("\n6. Generating embeddings and adding to ChromaDB...")
     
-    # 5. Vérifier
-    print("\n5. Verification...")
+    if not records:
+        print("   ✅ Nothing to embed, collection is up to date")
+    else:
+        if committed:
+            print(f"   ⏩ Resuming after batch {committed}/{total_batches}")
+        # Upsert : remplace les chunks modifiés. Les lots d'encodage sont
+        # dimensionnés en tokens par le batcher (peu de padding)
+        stats = pipelined_ingest(collection, records, encode=batcher.encode,
+                                 batch_size=batch_size, upsert=True,
+                                 checkpoint=checkpoint, skip_batches=committed)
+        print_ingest_summary(stats)
+        print(f"      {cache.summary()}")
+    
+    # 7. Vérifier
+    print("\n7. Verification...")
     count = collection.count()
+    missing = verify_collection(collection, list(current), batch_size)
     print(f"   ✅ Total documents in collection: {count}")
     
+    # Le job n'est terminé qu'une fois la collection vérifiée
+    checkpoint.clear()
+    if missing or count != len(current):
+        print(f"   ❌ Expected {len(current)} documents, {len(missing)} missing "
+              f"(duplicate chunk keys in {CHUNKS_FILE}?)")
+        print("   Manifest not updated, run again to rebuild the collection")
+        return
+    
+    # Le manifest n'est écrit qu'une fois la collection à jour
+    save_manifest({
+        'model': MODEL_NAME,
+        'collection': COLLECTION_NAME,
+        'chunks': current
+    })
+    
+    # Miroir NumPy de la collection pour la recherche dense en mémoire
+    dense_path = dense_index_path(COLLECTION_NAME, './chroma_data')
+    exported = export_collection(collection, dense_path, MODEL_NAME, precision=dense_precision,
+                                 dims=dense_dims or None)
+    print(f"   ✅ Dense index exported: {exported} vectors ({dense_precision}"
+          f"{f', PCA {dense_dims}d' if dense_dims else ''}) -> {dense_path}")
+    if ivf_lists and exported:
+        ivf_stats = build_ivf(dense_path, n_lists=ivf_lists if ivf_lists > 0 else None)
+        print(f"   ✅ IVF index built: {ivf_stats['n_lists']} partitions "
+              f"in {ivf_stats['build_seconds']}s")
+    
     print("\n" + "="*70)
     print("✅ EMBEDDINGS CREATED SUCCESSFULLY!")
     print("="*70)
-    print(f"\nCollection: wiki")
+    print(f"\nCollection: {COLLECTION_NAME}")
     print(f"Documents: {count}")
+    print(f"Embedded this run: {len(records)}")
     print(f"Storage: ./chroma_data/")
     print(f"\nNext step: Run 'python hybrid_rag_retriever.py' to test RAG")
 
 
 if __name__ == '__main__':
-    create_wiki_embeddings()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Embed processed_wiki chunks into the wiki collection")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only embed new/changed chunks and delete stale ones")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Chunks per Chroma write batch")
+    parser.add_argument('--dense-precision', choices=DENSE_PRECISIONS, default=DEFAULT_DENSE_PRECISION,
+                        help="Storage scanned by the NumPy dense index (float16/int8 rescore in float32)")
+    parser.add_argument('--ivf-lists', type=int, default=0,
+                        help="Build an IVF index with this many partitions (-1 = ~4*sqrt(n), 0 = none)")
+    parser.add_argument('--dense-dims', type=int, default=0,
+                        help="Reduce dense index vectors to this many dimensions with PCA (0 = full)")
+    args = parser.parse_args()
+    
+    create_wiki_embeddings(incremental=args.incremental, batch_size=args.batch_size,
+                           dense_precision=args.dense_precision, ivf_lists=args.ivf_lists,
+                           dense_dims=args.dense_dims)
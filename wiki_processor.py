@@ -1,6 +1,12 @@
 import os
 import json
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from chunk_store import ChunkWriter, chunk_key
+from near_duplicates import NearDuplicateDetector
+from bm25_index import build_bm25
+from trigram_index import build_trigrams
 
 def detect_category(filename: str, content: str) -> str:
     """Détecte la catégorie du document"""
@@ -74,14 +80,84 @@ def extract_title(content: str, filename: str) -> str:
     # Sinon utiliser le nom du fichier
     return filename.replace('.md', '').replace('_', ' ').title()
 
-def process_wiki_documents():
-    """Traiter tous les documents wiki"""
+def process_file(filepath: str):
+    """
+    Lit, catégorise, titre et découpe un fichier markdown
+    
+    Exécutée dans les processus du pool en mode parallèle : ne doit
+    dépendre que de ses arguments.
+    
+    Returns:
+        (chunks, document_info), ou None si le fichier est vide
+    """
+    filename = os.path.basename(filepath)
+    
+    # Lire le fichier
+    with open(filepath, 'r', encoding='utf-8') as f:
+        content = f.read()
+    
+    # Vérifier que le contenu n'est pas vide
+    if not content.strip():
+        return None
+    
+    # Compter mots
+    word_count = len(content.split())
+    
+    # Détecter catégorie
+    category = detect_category(filename, content)
+    
+    # Extraire titre
+    title = extract_title(content, filename)
+    
+    # Découper en chunks
+    chunks = chunk_text(content, chunk_size=500, overlap=50)
+    
+    file_chunks = [
+        {
+            'content': chunk_content,
+            'source': filename,
+            'title': title,
+            'category': category,
+            'chunk_id': i
+        }
+        for i, chunk_content in enumerate(chunks)
+    ]
+    
+    # Info du document
+    document_info = {
+        'filename': filename,
+        'title': title,
+        'category': category,
+        'word_count': word_count,
+        'chunk_count': len(chunks)
+    }
+    
+    return file_chunks, document_info
+
+def process_wiki_documents(workers: int = 1, dedup: str = 'off',
+                           dedup_threshold: float = 0.8):
+    """
+    Traiter tous les documents wiki
+    
+    Args:
+        workers: Nombre de processus (1 = séquentiel, 0 = un par coeur).
+                 Les résultats sont écrits au fil de l'eau, toujours dans
+                 l'ordre alphabétique des fichiers.
+        dedup: Détection des quasi-doublons (MinHash/LSH) entre chunks :
+               'off', 'mark' (ajoute 'duplicate_of' au chunk, les embedders
+               l'ignorent) ou 'collapse' (le doublon n'est pas écrit).
+               Le canonique est le premier chunk rencontré.
+        dedup_threshold: Similarité de Jaccard estimée minimale
+    """
     wiki_dir = 'wiki_data'
     output_dir = 'processed_wiki'
     
     # Créer répertoire de sortie
     Path(output_dir).mkdir(exist_ok=True)
     
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    
     print("="*70)
     print("WIKI DOCUMENT PROCESSOR")
     print("="*70)
@@ -104,77 +180,98 @@ def process_wiki_documents():
         print(f"      - {f}")
     
     # 2. Traiter chaque document
-    print(f"\n2. Processing documents...")
+    mode = f"{workers} processes" if workers > 1 else "sequential"
+    print(f"\n2. Processing documents ({mode})...")
+    
+    filepaths = [os.path.join(wiki_dir, filename) for filename in sorted(md_files)]
     
     all_chunks = []
     documents_info = []
+    duplicates = {}
+    detector = NearDuplicateDetector(threshold=dedup_threshold) if dedup != 'off' else None
+    start_time = time.time()
     
-    for filename in sorted(md_files):
-        filepath = os.path.join(wiki_dir, filename)
-        
-        print(f"\n   Processing: {filename}")
-        
-        # Lire le fichier
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Vérifier que le contenu n'est pas vide
-        if not content.strip():
-            print(f"      ⚠️  Warning: Empty file, skipping...")
-            continue
-        
-        # Compter mots
-        word_count = len(content.split())
-        print(f"      Words: {word_count}")
-        
-        # Détecter catégorie
-        category = detect_category(filename, content)
-        
-        # Extraire titre
-        title = extract_title(content, filename)
-        
-        # Découper en chunks
-        chunks = chunk_text(content, chunk_size=500, overlap=50)
-        print(f"      Chunks: {len(chunks)}")
-        
-        # Ajouter chunks à la liste
-        for i, chunk_content in enumerate(chunks):
-            all_chunks.append({
-                'content': chunk_content,
-                'source': filename,
-                'title': title,
-                'category': category,
-                'chunk_id': i
-            })
+    # Les chunks sont écrits au fur et à mesure (JSONL + index d'offsets)
+    chunks_file = os.path.join(output_dir, 'chunks.jsonl')
+    writer = ChunkWriter(chunks_file)
+    
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        if executor:
+            # map() rend les résultats dans l'ordre des fichiers dès qu'ils sont prêts
+            results = executor.map(process_file, filepaths,
+                                   chunksize=max(1, len(filepaths) // (workers * 8)))
+        else:
+            results = map(process_file, filepaths)
         
-        # Info du document
-        documents_info.append({
-            'filename': filename,
-            'title': title,
-            'category': category,
-            'word_count': word_count,
-            'chunk_count': len(chunks)
-        })
+        with writer:
+            for filepath, result in zip(filepaths, results):
+                filename = os.path.basename(filepath)
+                print(f"\n   Processing: {filename}")
+                
+                if result is None:
+                    print(f"      ⚠️  Warning: Empty file, skipping...")
+                    continue
+                
+                file_chunks, document_info = result
+                print(f"      Words: {document_info['word_count']}")
+                print(f"      Chunks: {len(file_chunks)}")
+                
+                for chunk in file_chunks:
+                    if detector:
+                        canonical = detector.add(chunk_key(chunk), chunk['content'])
+                        if canonical:
+                            duplicates[chunk_key(chunk)] = canonical
+                            if dedup == 'collapse':
+                                continue
+                            chunk['duplicate_of'] = canonical
+                    writer.write(chunk)
+                    all_chunks.append(chunk)
+                
+                documents_info.append(document_info)
+    finally:
+        if executor:
+            executor.shutdown()
+    
+    elapsed = time.time() - start_time
     
     # 3. Sauvegarder les résultats
     print(f"\n3. Saving processed data...")
     
-    # Sauvegarder chunks
-    chunks_file = os.path.join(output_dir, 'chunks.json')
-    with open(chunks_file, 'w', encoding='utf-8') as f:
-        json.dump(all_chunks, f, ensure_ascii=False, indent=2)
+    # Chunks déjà publiés par le writer
     print(f"   ✅ Saved {len(all_chunks)} chunks to {chunks_file}")
     
+    # Index BM25 de la recherche sparse (seuls les chunks nouveaux ou modifiés sont tokenisés)
+    bm25_stats = build_bm25(chunks_file)
+    print(f"   ✅ BM25 index: {bm25_stats['terms']} terms, "
+          f"{bm25_stats['tokenized']} chunks tokenized in {bm25_stats['build_seconds']}s")
+    
+    # Index de trigrammes de la recherche exacte (identifiants, phrases)
+    trigram_stats = build_trigrams(chunks_file)
+    print(f"   ✅ Trigram index: {trigram_stats['trigrams']} trigrams "
+          f"in {trigram_stats['build_seconds']}s")
+    
     # Sauvegarder metadata
     metadata_file = os.path.join(output_dir, 'metadata.json')
     with open(metadata_file, 'w', encoding='utf-8') as f:
         json.dump({
             'total_documents': len(documents_info),
             'total_chunks': len(all_chunks),
-            'documents': documents_info
+            'documents': documents_info,
+            'duplicates': duplicates
         }, f, ensure_ascii=False, indent=2)
     print(f"   ✅ Saved metadata to {metadata_file}")
     
+    if detector:
+        action = 'dropped' if dedup == 'collapse' else 'marked'
+        print(f"   ✅ Near-duplicate chunks {action}: {len(duplicates)}")
+        for duplicate, canonical in sorted(duplicates.items())[:10]:
+            print(f"      - {duplicate} ≈ {canonical}")
+    
+    if not documents_info:
+        print("   ❌ Error: All markdown files were empty!")
+        return
+    
     # 4. Statistiques
     print(f"\n4. Statistics:")
     print(f"\n   Total documents: {len(documents_info)}")
@@ -197,7 +294,21 @@ def process_wiki_documents():
     print(f"\nProcessed files: {len(documents_info)}")
     print(f"Output directory: {output_dir}/")
     print(f"Total chunks: {len(all_chunks)}")
+    print(f"Throughput: {len(filepaths)/max(elapsed, 1e-9):.1f} files/sec, "
+          f"{len(all_chunks)/max(elapsed, 1e-9):.1f} chunks/sec ({elapsed:.2f}s, {mode})")
     print(f"\nNext step: Run 'python wiki_embedder.py' to create embeddings")
 
 if __name__ == '__main__':
-    process_wiki_documents()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Process wiki_data/*.md into chunks")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes (1 = sequential, 0 = one per CPU core)")
+    parser.add_argument('--dedup', choices=['off', 'mark', 'collapse'], default='off',
+                        help="Near-duplicate chunk handling (MinHash/LSH)")
+    parser.add_argument('--dedup-threshold', type=float, default=0.8,
+                        help="Estimated Jaccard similarity above which chunks are duplicates")
+    args = parser.parse_args()
+    
+    process_wiki_documents(workers=args.workers, dedup=args.dedup,
+                           dedup_threshold=args.dedup_threshold)
\ No newline at end of file